@@ -0,0 +1,180 @@
+// Chunked, resumable upload: files are streamed to disk by the server and parsed as soon as they are complete
+(function () {
+
+    var UPLOAD_URL = '/mesh/upload/';
+    var MAX_RETRIES = 5;
+    var STORAGE_KEY = 'mesh-upload';
+
+    // Uploads of an older selection stop at their next chunk
+    var generation = 0;
+
+    function getCookie(name) {
+        var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function request(method, url, body, headers) {
+        return window.fetch(url, {
+            method: method,
+            body: body,
+            credentials: 'same-origin',
+            headers: Object.assign({'X-CSRFToken': getCookie('csrftoken')}, headers)
+        }).then(function (response) {
+            if (!response.ok) {
+                // Message of rejected requests (e.g. unsupported PVD collection)
+                return response.text().then(function (text) {
+                    throw new Error(response.status === 400 && text ? text : response.status + ' ' + response.statusText);
+                });
+            }
+            return response.json();
+        });
+    }
+
+    function delay(ms) {
+        return new Promise(function (resolve) { window.setTimeout(resolve, ms); });
+    }
+
+    function setStatus(text) {
+        var element = document.getElementById('output-image-upload');
+        if (element) {
+            element.textContent = text;
+        }
+    }
+
+    function readPvd(files) {
+        // Collection is small: it gives the frame order before the frames arrive
+        var pvd = files.filter(function (f) { return f.name.toLowerCase().endsWith('.pvd'); })[0];
+        return pvd ? pvd.text() : Promise.resolve(null);
+    }
+
+    function getFingerprint(files) {
+        return files.map(function (f) { return f.name + ':' + f.size + ':' + f.lastModified; }).join('|');
+    }
+
+    function uploadFile(file, entry, chunkSize, current, onProgress) {
+        var retries = 0;
+
+        function next() {
+            if (current !== generation) {
+                return Promise.reject(new Error('Upload cancelled'));
+            }
+            if (entry.offset >= entry.size) {
+                return Promise.resolve();
+            }
+            var end = Math.min(entry.offset + chunkSize, entry.size);
+            return request('PUT', entry.url, file.slice(entry.offset, end), {
+                'Content-Range': 'bytes ' + entry.offset + '-' + (end - 1) + '/' + entry.size,
+                'Content-Type': 'application/octet-stream'
+            }).then(function (result) {
+                retries = 0;
+                entry.offset = result.offset;
+                entry.ready = result.ready;
+                onProgress();
+                return next();
+            }, function (error) {
+                if (++retries > MAX_RETRIES) {
+                    throw error;
+                }
+                // Resume from the bytes received by the server
+                return delay(1000 * retries).then(function () {
+                    return request('GET', entry.url);
+                }).then(function (result) {
+                    entry.offset = result.offset;
+                }, function () {}).then(next);
+            });
+        }
+
+        return next();
+    }
+
+    function upload(fileList) {
+        var files = Array.prototype.slice.call(fileList);
+        var current = ++generation;
+        var fingerprint = getFingerprint(files);
+        var previous = JSON.parse(window.sessionStorage.getItem(STORAGE_KEY) || 'null');
+
+        setStatus('Preparing upload...');
+        readPvd(files).then(function (pvd) {
+            return request('POST', UPLOAD_URL, JSON.stringify({
+                files: files.map(function (f) { return {name: f.name, size: f.size}; }),
+                pvd: pvd,
+                // Same files again: the interrupted upload is resumed
+                dataset: previous && previous.fingerprint === fingerprint ? previous.dataset : null
+            }), {'Content-Type': 'application/json'});
+        }).then(function (status) {
+            window.sessionStorage.setItem(STORAGE_KEY, JSON.stringify({fingerprint: fingerprint, dataset: status.dataset}));
+            var byName = {};
+            files.forEach(function (f) { byName[f.name] = f; });
+            var total = status.files.reduce(function (sum, entry) { return sum + entry.size; }, 0);
+
+            function onProgress() {
+                var received = status.files.reduce(function (sum, entry) { return sum + entry.offset; }, 0);
+                setStatus('Uploading files: ' + (received / 1048576).toFixed(1) + ' / ' + (total / 1048576).toFixed(1) + ' MB');
+            }
+
+            var started = false;
+
+            function start() {
+                if (!started) {
+                    started = true;
+                    document.getElementById('upload-start').click();
+                }
+            }
+
+            // Files one by one in the order given by the server (the view opens once the first frame is parsed)
+            var chain = Promise.resolve();
+            status.files.forEach(function (entry) {
+                chain = chain.then(function () {
+                    return uploadFile(byName[entry.source], entry, status.chunk_size, current, onProgress);
+                }).then(function () {
+                    if (entry.ready) {
+                        start();
+                    }
+                });
+            });
+            return chain.then(start);
+        }).then(function () {
+            window.sessionStorage.removeItem(STORAGE_KEY);
+            setStatus('Uploaded ' + files.length + ' files');
+        }, function (error) {
+            if (current === generation) {
+                setStatus('Upload failed: ' + error.message + ' (drop the same files again to resume)');
+            }
+        });
+    }
+
+    function getDropZone(event) {
+        return event.target.closest ? event.target.closest('#upload-image') : null;
+    }
+
+    // Drop zone is rendered by Dash after this script is loaded
+    var input = null;
+    document.addEventListener('click', function (event) {
+        if (!getDropZone(event)) {
+            return;
+        }
+        if (!input) {
+            input = document.createElement('input');
+            input.type = 'file';
+            input.multiple = true;
+            input.style.display = 'none';
+            input.addEventListener('change', function () {
+                upload(input.files);
+                input.value = '';
+            });
+            document.body.appendChild(input);
+        }
+        input.click();
+    });
+    document.addEventListener('dragover', function (event) {
+        if (getDropZone(event)) {
+            event.preventDefault();
+        }
+    });
+    document.addEventListener('drop', function (event) {
+        if (getDropZone(event)) {
+            event.preventDefault();
+            upload(event.dataTransfer.files);
+        }
+    });
+})();
@@ -0,0 +1,112 @@
+// Client-side (WebGL) mesh view: geometry is decoded once, only values change per frame
+(function () {
+
+    // Decoded arrays of the last geometry and node positions
+    var decoded = {};
+
+    function decode(b64, Type) {
+        var binary = window.atob(b64);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new Type(bytes.buffer);
+    }
+
+    function getDecoded(name, key, build) {
+        if (!decoded[name] || decoded[name].key !== key) {
+            decoded[name] = {key: key, value: build()};
+        }
+        return decoded[name].value;
+    }
+
+    function getTriangles(geometry) {
+        var triangles = decode(geometry.triangles, Int32Array);
+        var n = geometry.ntriangles;
+        var i = new Int32Array(n), j = new Int32Array(n), k = new Int32Array(n);
+        for (var m = 0; m < n; m++) {
+            i[m] = triangles[3 * m];
+            j[m] = triangles[3 * m + 1];
+            k[m] = triangles[3 * m + 2];
+        }
+        return {i: i, j: j, k: k, cells: decode(geometry.cells, Int32Array)};
+    }
+
+    function dequantize(values) {
+        var quantized = decode(values.values, Uint16Array);
+        var step = (values.vmax - values.vmin) / values.max;
+        var result = new Float32Array(quantized.length);
+        for (var m = 0; m < quantized.length; m++) {
+            result[m] = quantized[m] === values.nan ? NaN : values.vmin + quantized[m] * step;
+        }
+        return result;
+    }
+
+    function render(geometry, points, values, colorscale) {
+        if (!geometry || !points) {
+            return {data: [], layout: {}};
+        }
+
+        var mesh = getDecoded('geometry', geometry.topology, function () { return getTriangles(geometry); });
+        var xy = getDecoded('points', points.key, function () {
+            return {x: decode(points.x, Float32Array), y: decode(points.y, Float32Array)};
+        });
+        var value = values ? dequantize(values) : null;
+
+        var trace;
+        if (geometry.ntriangles === 0) {
+            // Point cloud
+            trace = {
+                type: 'scattergl', mode: 'markers', x: xy.x, y: xy.y, hoverinfo: 'skip',
+                marker: value ? {
+                    size: 3, color: value, colorscale: colorscale, cmin: values.vmin, cmax: values.vmax, showscale: true
+                } : {size: 3, color: 'black'}
+            };
+            return {
+                data: [trace],
+                layout: {
+                    uirevision: points.key, margin: {l: 0, r: 0, t: 0, b: 0}, dragmode: 'pan',
+                    xaxis: {visible: false}, yaxis: {visible: false, scaleanchor: 'x'}
+                }
+            };
+        }
+
+        // Triangles colored by the value of their cell
+        trace = {
+            type: 'mesh3d', x: xy.x, y: xy.y, z: new Float32Array(xy.x.length),
+            i: mesh.i, j: mesh.j, k: mesh.k, flatshading: true, hoverinfo: 'skip',
+            lighting: {ambient: 1, diffuse: 0, specular: 0, roughness: 1, fresnel: 0}
+        };
+        if (value) {
+            var intensity = new Float32Array(geometry.ntriangles);
+            for (var m = 0; m < geometry.ntriangles; m++) {
+                intensity[m] = value[mesh.cells[m]];
+            }
+            Object.assign(trace, {
+                intensity: intensity, intensitymode: 'cell', colorscale: colorscale,
+                cmin: values.vmin, cmax: values.vmax
+            });
+        } else {
+            Object.assign(trace, {color: 'lightgray', showscale: false});
+        }
+
+        return {
+            data: [trace],
+            layout: {
+                // Zoom and pan are kept while frames change
+                uirevision: geometry.topology,
+                margin: {l: 0, r: 0, t: 0, b: 0},
+                scene: {
+                    aspectmode: 'data',
+                    dragmode: 'pan',
+                    camera: {eye: {x: 0, y: 0, z: 2}, up: {x: 0, y: 1, z: 0}, projection: {type: 'orthographic'}},
+                    xaxis: {visible: false}, yaxis: {visible: false}, zaxis: {visible: false}
+                }
+            }
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        mesh: {render: render}
+    });
+})();
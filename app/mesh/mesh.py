@@ -1,48 +1,524 @@
 import base64
+import hashlib
 import io
+import os
 import re
-import copy
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from django_plotly_dash import DjangoDash
-from dash.dependencies import Input, Output, State
+import dash
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.text import get_valid_filename
 import dash_core_components as dcc
 import dash_html_components as html
 from plotly.tools import mpl_to_plotly
-import matplotlib.pyplot as plt
-import numpy as np
 
-from .module.vtu_reader import VtkReader
 from .module.draw_mesh import DrawMesh
+from .module.frame_cache import FrameCache
+from .module.npy_cache import NpyCache
+from .module.ingest import FrameIngestion, create_reader
+from .module.pvtu_reader import PvtuReader
+from .module.pvd_reader import PvdReader
+from .module.renderer import FigureRenderer
+from .module.geometry import MeshGeometry
+from .module.topology import TopologyStore
+from .module.prefetch import FramePrefetcher
+from .module.image_store import ImageStore
+from .module.webgl import get_geometry_payload, get_points_key, get_points_payload, get_values_payload
+from .module.dataset import DatasetRegistry
+from .module.upload import parse_content_range, write_chunk
+from .module.archive import MeshArchive, is_archive
+from .module.watch import FRAME_SUFFIXES, get_frame_number, resolve_watch_dir, scan_frames
+from .module.column_store import ColumnStore
 
 
-class MeshData:
+# Figures shared by concurrent renders
+renderer = FigureRenderer(settings.MESH_RENDER_POOL_SIZE)
 
-    def __init__(self):
+# Parsed frames
+frame_cache = FrameCache(settings.MESH_FRAME_CACHE_BYTES, settings.MESH_FRAME_CACHE_FRAMES)
+npy_cache = NpyCache(settings.MESH_NPY_CACHE_ROOT, settings.MESH_NPY_CACHE_BYTES)
 
-        # VTK data
-        self.ndata = 0
-        self.file_list = []
-        self.ios_list = []
-        self.data_dict = {}
+# Connectivities shared by frames
+topology_store = TopologyStore(settings.MESH_TOPOLOGY_ROOT, settings.MESH_TOPOLOGY_CACHE_BYTES)
 
-        # Display area
-        self.domain = {
-            'xmin': None,
-            'xmax': None,
-            'ymin': None,
-            'ymax': None,
-            'aspect': None
-        }
+# Drawing geometry by connectivity hash
+geometry_cache = FrameCache(settings.MESH_GEOMETRY_CACHE_BYTES)
 
+# Rendered images (PNG) by content key
+image_cache = FrameCache(settings.MESH_IMAGE_CACHE_BYTES)
+image_store = ImageStore(settings.MESH_IMAGE_ROOT, settings.MESH_IMAGE_STORE_BYTES)
+prefetch_executor = ThreadPoolExecutor(max_workers=settings.MESH_PREFETCH_WORKERS)
 
-# Mesh data
-mdata = MeshData()
+# Datasets of the sessions (any worker opens them from disk)
+registry = DatasetRegistry(settings.MESH_DATASET_ROOT, settings.MESH_DATASET_TTL, max_bytes=settings.MESH_DATASET_BYTES,
+                           caches=[npy_cache, topology_store, image_store])
 
-# Mesh drawer
-drawer = DrawMesh()
 
-# VTK Reader
-reader = VtkReader()
+# Frame ingestion
+executor = ProcessPoolExecutor(max_workers=settings.MESH_INGEST_WORKERS)
+archive_executor = ThreadPoolExecutor(max_workers=settings.MESH_INGEST_WORKERS)
+
+# Copy of parsed frames into the field columns (out of the result thread of the process pool)
+column_executor = ThreadPoolExecutor(max_workers=settings.MESH_INGEST_WORKERS)
+
+
+def get_session_key(request):
+
+    # Session is stored before its first dataset is created
+    if request.session.session_key is None:
+        request.session.save()
+
+    return request.session.session_key
+
+
+def get_session_data(request):
+
+    # Idle datasets of all sessions are removed from time to time
+    for dataset_id in registry.evict():
+        frame_cache.discard(dataset_id)
+
+    mdata = registry.get(registry.get_session_dataset(request.session.session_key))
+
+    # Frames parsed (or added in tail mode) by other workers
+    if mdata is not None and (None in mdata.hash_list or mdata.watch_dir is not None):
+        mdata.load()
+        # Frames claimed by workers which died are parsed again
+        if mdata.watch_dir is None and None in mdata.hash_list:
+            submit_ready_frames(mdata)
+
+    return mdata
+
+
+def record_frame(mdata, ifig, result):
+
+    mdata.hash_list[ifig] = result['key']
+    mdata.statistics.add_frame(ifig, result['statistics'])
+
+
+def open_frame(mdata, ifig, key):
+
+    # Open ingested frame (memory-mapped) and keep it in memory
+    frame = create_reader(mdata.path_list[ifig])
+    frame.read(mdata.path_list[ifig], cache_dir=npy_cache.frame_dir(key), topology=topology_store)
+    frame_cache.put((mdata.dataset_id, ifig), frame)
+
+    return frame
+
+
+def get_frame_key(mdata, ifig):
+
+    # Wait for the ingestion of the frame (in this worker or in the one which received the files)
+    # Frames not ingested in time are skipped like frames which cannot be read (requests stay below the worker timeout)
+    if mdata.hash_list[ifig] is None:
+        try:
+            result = mdata.ingestion.wait(ifig, timeout=settings.MESH_FRAME_WAIT_TIMEOUT) if mdata.ingestion is not None else None
+        except TimeoutError as e:
+            raise ValueError(str(e))
+        except Exception as e:
+            raise ValueError('Cannot read {}: {}'.format(mdata.file_list[ifig], e))
+        if result is not None:
+            record_frame(mdata, ifig, result)
+        else:
+            try:
+                mdata.wait_frame(ifig, timeout=settings.MESH_FRAME_WAIT_TIMEOUT)
+            except TimeoutError as e:
+                raise ValueError(str(e))
+
+    return mdata.hash_list[ifig]
+
+
+def on_frame_done(mdata, ifig, result):
+
+    if mdata.removed:
+        return
+
+    # Errors of this thread are recorded (the future of the column executor is never read)
+    try:
+        frame = open_frame(mdata, ifig, result['key'])
+        # Fields are copied into the columns of the dataset before the frame is published
+        fields = {}
+        for tag in frame.get_data_dict():
+            field = frame.get_field(tag) if tag != 'Mesh' else None
+            if field is not None:
+                fields[tag] = field
+        get_columns(mdata).put_frame(ifig, fields)
+        mdata.set_frame(ifig, result)
+        save_statistics(mdata)
+    except Exception as e:
+        on_frame_error(mdata, ifig, e)
+
+
+def is_ingested(mdata):
+
+    # All frames are parsed or cannot be read (frames keep arriving in tail mode)
+    return mdata.watch_dir is None and all(key is not None or mdata.get_error(ifig) is not None for ifig, key in enumerate(mdata.hash_list))
+
+
+def save_statistics(mdata):
+
+    # Keep statistics with the dataset once all frames are ingested (display range of every worker)
+    if is_ingested(mdata):
+        mdata.statistics.save(os.path.join(mdata.dataset_dir, 'statistics.json'))
+
+
+def freeze_statistics(mdata):
+
+    # Display area and color range are fixed by the statistics saved once all frames are ingested
+    if not mdata.statistics_frozen and is_ingested(mdata):
+        try:
+            mdata.statistics.load(os.path.join(mdata.dataset_dir, 'statistics.json'))
+        except FileNotFoundError:
+            return False
+        mdata.statistics_frozen = True
+
+    return mdata.statistics_frozen
+
+
+def get_columns(mdata):
+
+    with mdata.lock:
+        if mdata.columns is None:
+            mdata.columns = ColumnStore(os.path.join(mdata.dataset_dir, 'columns'), settings.MESH_COLUMN_CHUNK_FRAMES)
+
+    return mdata.columns
+
+
+def get_value(mdata, ifig, tag, sys):
+
+    # Slice of the column store (frames with another layout are read from their own arrays)
+    value = get_columns(mdata).get_frame(tag, ifig, sys)
+    if value is None:
+        reader = load_frame(mdata, ifig)
+        value = reader.get_value(tag, system=sys)
+        frame_cache.put((mdata.dataset_id, ifig), reader)
+
+    return value
+
+
+def get_cell_history(mdata, tag, sys, icell):
+
+    # Values of one cell in all frames (slices of the column store)
+    return get_columns(mdata).get_cell(tag, icell, sys, mdata.ndata)
+
+
+def on_frame_error(mdata, ifig, error):
+
+    # Recorded for all workers (waiting for the frame ends with the error)
+    if not mdata.removed:
+        mdata.set_error(mdata.file_list[ifig], '{}: {}'.format(type(error).__name__, error))
+        save_statistics(mdata)
+
+
+def submit_ready_frames(mdata):
+
+    # Frames are parsed as soon as their files are complete (by the worker which received the last one)
+    for ifig, path in enumerate(mdata.path_list):
+        if mdata.hash_list[ifig] is not None or mdata.get_error(ifig) is not None or not os.path.exists(path):
+            continue
+        if mdata.is_claimed(ifig, timeout=settings.MESH_INGEST_CLAIM_TIMEOUT):
+            continue
+        if path.lower().endswith('.pvtu') and not all(os.path.exists(p) for p in PvtuReader().get_sources(path)):
+            continue
+        if mdata.claim_frame(ifig, timeout=settings.MESH_INGEST_CLAIM_TIMEOUT):
+            with mdata.lock:
+                if mdata.ingestion is None:
+                    mdata.ingestion = FrameIngestion(executor, settings.MESH_NPY_CACHE_ROOT, settings.MESH_TOPOLOGY_ROOT)
+            mdata.ingestion.submit(ifig, path, on_done=lambda ifig, result: column_executor.submit(on_frame_done, mdata, ifig, result),
+                                   on_error=lambda ifig, error: on_frame_error(mdata, ifig, error))
+
+
+def get_frame_order(names, pvd_content=None):
+
+    # Frame order: PVD collection if uploaded, otherwise number in file names
+    if pvd_content is not None:
+        pvd = PvdReader()
+        pvd.read(io.BytesIO(pvd_content))
+        frames = [(t, os.path.basename(f)) for t, f in zip(pvd.times, pvd.files) if os.path.basename(f) in names]
+        return [f for _, f in frames], [t for t, _ in frames]
+
+    # Pieces of partitioned files are not frames
+    pvtu_names = [name for name in names if name.lower().endswith('.pvtu')]
+    vtu_names = [name for name in names if name.lower().endswith('.vtu')]
+    return sorted(pvtu_names or vtu_names, key=get_frame_number), None
+
+
+def get_natural_key(name):
+
+    return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', name)]
+
+
+def create_session_data(request):
+
+    # Discard previous data of the session
+    session_key = get_session_key(request)
+    previous_id = registry.get_session_dataset(session_key)
+    registry.remove(previous_id)
+    frame_cache.discard(previous_id)
+    mdata = registry.create()
+    registry.set_session_dataset(session_key, mdata.dataset_id)
+
+    npy_cache.evict()
+    topology_store.evict()
+    image_store.evict()
+
+    return mdata
+
+
+def start_upload(request, files, pvd_content=None):
+
+    # Files are sent afterwards in chunks (the PVD collection only gives the frame order)
+    upload_files = {}
+    for f in files:
+        if not f['name'].lower().endswith('.pvd'):
+            upload_files[get_valid_filename(os.path.basename(f['name']))] = int(f['size'])
+    # Frames of an archive are known once it has arrived
+    if any(is_archive(name) for name in upload_files):
+        file_list, time_list = [], None
+    else:
+        file_list, time_list = get_frame_order(list(upload_files.keys()), pvd_content)
+
+    mdata = create_session_data(request)
+    mdata.update(ndata=len(file_list), file_list=file_list, time_list=time_list,
+                 path_list=[os.path.join(mdata.dataset_dir, name) for name in file_list],
+                 hash_list=[None] * len(file_list), upload_files=upload_files)
+    for name, size in upload_files.items():
+        if size == 0:
+            open(os.path.join(mdata.dataset_dir, name), 'wb').close()
+
+    return mdata
+
+
+def start_watch(request, directory):
+
+    # Frames are read in place from the followed directory
+    watch_dir = resolve_watch_dir(directory, settings.MESH_WATCH_ROOTS)
+    _, times = scan_frames(watch_dir, settle=settings.MESH_WATCH_SETTLE)
+    mdata = create_session_data(request)
+    mdata.update(watch_dir=watch_dir, time_list=[] if times is not None else None)
+    follow_frames(mdata)
+
+    return mdata
+
+
+def follow_frames(mdata):
+
+    # New complete files of the followed directory (at most once per watch interval in each worker)
+    now = time.monotonic()
+    if mdata.watch_dir is None or now - mdata.last_scan < settings.MESH_WATCH_INTERVAL:
+        return
+    mdata.last_scan = now
+    try:
+        names, times = scan_frames(mdata.watch_dir, settle=settings.MESH_WATCH_SETTLE)
+    except ValueError as e:
+        mdata.set_error(os.path.basename(mdata.watch_dir), str(e))
+        return
+    if any(name not in mdata.file_list for name in names):
+        mdata.add_frames(names, [os.path.join(mdata.watch_dir, name) for name in names], times)
+    submit_ready_frames(mdata)
+
+
+def get_upload_order(mdata):
+
+    # First and last frames first (display area), then the others, each followed by its pieces (partitioned files)
+    names = [os.path.basename(path) for path in mdata.path_list]
+    others = sorted(set(mdata.upload_files) - set(names), key=get_natural_key)
+    order = []
+    for i in dict.fromkeys([0, mdata.ndata - 1] + list(range(mdata.ndata))):
+        if 0 <= i < mdata.ndata:
+            order.append(names[i])
+            order += [name for name in others if is_piece(name, names[i])]
+    order += [name for name in others if name not in order]
+
+    return list(dict.fromkeys(order))
+
+
+def is_piece(name, frame_name):
+
+    # Pieces are named after their frame (out_1.pvtu: out_1_0.vtu, out_1_1.vtu but not out_10_0.vtu)
+    stem = os.path.splitext(frame_name)[0]
+    return name.startswith(stem) and len(name) > len(stem) and not name[len(stem)].isdigit() and name != frame_name
+
+
+def receive_chunk(mdata, name, stream, content_range):
+
+    start, _, total = parse_content_range(content_range)
+    if total != mdata.upload_files[name]:
+        raise ValueError('Size of {} does not match'.format(name))
+
+    # Body is streamed to the file (ingestion starts while other files are arriving)
+    offset, completed = write_chunk(os.path.join(mdata.dataset_dir, name), stream, start, total)
+    if completed:
+        if is_archive(name):
+            open_archive(mdata, os.path.join(mdata.dataset_dir, name))
+        else:
+            submit_ready_frames(mdata)
+
+    return offset
+
+
+def open_archive(mdata, path):
+
+    # Listing decompresses tar archives as a whole: it is not done in the request
+    archive_executor.submit(extract_archive, mdata, path)
+
+
+def extract_archive(mdata, path):
+
+    try:
+        archive = MeshArchive(path)
+    except ValueError as e:
+        mdata.set_error(os.path.basename(path), str(e))
+        return
+
+    # Frame order from the member names (PVD collection in the archive if any, other files are ignored)
+    members = {}
+    for member in archive.members:
+        name = get_valid_filename(os.path.basename(archive.get_name(member)))
+        if name.lower().endswith(FRAME_SUFFIXES):
+            members.setdefault(name, member)
+    pvd_names = [name for name in members if name.lower().endswith('.pvd')]
+    try:
+        pvd_content = archive.read(members[pvd_names[0]]) if len(pvd_names) > 0 else None
+        file_list, time_list = get_frame_order([name for name in members if name not in pvd_names], pvd_content)
+    except Exception as e:
+        archive.close()
+        mdata.set_error(os.path.basename(path), '{}: {}'.format(type(e).__name__, e))
+        return
+    if len(file_list) == 0:
+        archive.close()
+        mdata.set_error(os.path.basename(path), 'No VTU files in the archive')
+        return
+    mdata.update(ndata=len(file_list), file_list=file_list, time_list=time_list,
+                 path_list=[os.path.join(mdata.dataset_dir, name) for name in file_list],
+                 hash_list=[None] * len(file_list))
+
+    # Members are decompressed one at a time in archive order (each frame is parsed once it is written)
+    with archive:
+        for name, member in members.items():
+            if mdata.removed:
+                return
+            if name.lower().endswith('.pvd'):
+                continue
+            # Corrupt or truncated members are reported (the other members are still extracted)
+            try:
+                archive.extract(member, os.path.join(mdata.dataset_dir, name))
+            except Exception as e:
+                mdata.set_error(name, '{}: {}'.format(type(e).__name__, e))
+                continue
+            submit_ready_frames(mdata)
+
+    # Frames which cannot be parsed for lack of their files (partitioned frames with a corrupt piece)
+    for ifig, name in enumerate(file_list):
+        if mdata.hash_list[ifig] is None and mdata.get_error(ifig) is None and not mdata.is_claimed(ifig, timeout=settings.MESH_INGEST_CLAIM_TIMEOUT):
+            mdata.set_error(name, 'Files of the frame are missing in the archive')
+
+
+def load_frame(mdata, ifig):
+
+    frame = frame_cache.get((mdata.dataset_id, ifig))
+    if frame is None:
+        frame = open_frame(mdata, ifig, get_frame_key(mdata, ifig))
+
+    return frame
+
+
+def get_geometry(connectivity):
+
+    # Frames with the same topology share their geometry
+    if connectivity is None:
+        return None
+    key = connectivity.get_hash()
+    geometry = geometry_cache.get(key)
+    if geometry is None:
+        geometry = MeshGeometry(connectivity)
+        geometry_cache.put(key, geometry)
+
+    return geometry
+
+
+def get_image_key(mdata, ifig, tag, sys, domain, vrange):
+
+    # Same file contents give the same image in every worker
+    frame_key = get_frame_key(mdata, ifig)
+    params = (frame_key, tag, sys, tuple(domain.values()), vrange, settings.MESH_RENDER_ENGINE)
+
+    return hashlib.sha1(repr(params).encode()).hexdigest()
+
+
+def get_image(key):
+
+    # Rendered image of this worker or of another one
+    out_img = image_cache.get(key)
+    if out_img is None:
+        out_img = cache.get('mesh:image:' + key)
+        if out_img is not None:
+            image_cache.put(key, out_img)
+
+    return out_img
+
+
+def render_frame(mdata, ifig, tag, sys):
+
+    # Same display area and color range for all frames (provisional while frames are ingested)
+    frozen = freeze_statistics(mdata)
+    domain = get_domain(mdata.statistics.get_bounds())
+    vrange = None
+    if tag != 'Mesh':
+        vrange = mdata.statistics.get_range(tag, sys, percentiles=settings.MESH_COLOR_PERCENTILES)
+
+    # Only images of the final display range are cached
+    key = None
+    if frozen:
+        key = get_image_key(mdata, ifig, tag, sys, domain, vrange)
+        if image_store.exists(key) or get_image(key) is not None:
+            return key, None
+
+    # Read vtu data (fields parsed for this frame are kept in the cache)
+    reader = load_frame(mdata, ifig)
+    if tag == 'Mesh':
+        val = None
+    else:
+        val = get_value(mdata, ifig, tag, sys)
+    geometry = get_geometry(reader.Lnodes)
+
+    # Figure (one drawer per render: drawers keep the state of their axes)
+    def draw(ax):
+        drawer = DrawMesh(engine=settings.MESH_RENDER_ENGINE)
+        drawer.set_domain(ax, domain=domain)
+        if vrange is not None:
+            drawer.set_range(*vrange)
+        drawer.draw(coords=reader.Coords, connectivity=reader.Lnodes, value=val, geometry=geometry)
+
+    out_img = renderer.render(draw, aspect=domain['aspect'])
+    if key is not None:
+        image_cache.put(key, out_img)
+        cache.set('mesh:image:' + key, out_img, timeout=settings.MESH_IMAGE_CACHE_TTL)
+        image_store.put(key, out_img)
+
+    return key, out_img
+
+
+def get_domain(bounds):
+
+    # Display area with margins around the bounds of all frames
+    domain = {}
+    domain['xmin'], domain['xmax'], domain['ymin'], domain['ymax'] = bounds
+    len_x = domain['xmax'] - domain['xmin']
+    len_y = domain['ymax'] - domain['ymin']
+    domain['xmin'] -= 0.1 * len_x
+    domain['xmax'] += 0.1 * len_x
+    domain['ymin'] -= 0.1 * len_y
+    domain['ymax'] += 0.1 * len_y
+    domain['aspect'] = (domain['ymax'] - domain['ymin']) / (domain['xmax'] - domain['xmin'])
+
+    return domain
+
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
@@ -50,11 +526,13 @@ app = DjangoDash('mesh', external_stylesheets=external_stylesheets)
 
 app.layout = html.Div([
     html.Div([
-        dcc.Upload(
+        # Files are sent in chunks by assets/upload.js
+        html.Div(
             id='upload-image',
             children=html.Div([
                 'Drag and Drop or ',
-                html.A('Select Files')
+                html.A('Select Files'),
+                ' (.vtu, .pvtu, .pvd or a .zip / .tar.gz of them)'
             ]),
             style={
                 'width': '100%',
@@ -65,17 +543,37 @@ app.layout = html.Div([
                 'borderRadius': '5px',
                 'textAlign': 'center',
                 # 'margin': '10px'
+                'cursor': 'pointer',
             },
-            # Allow multiple files to be uploaded
-            multiple=True
         ),
+        # Upload progress (written by assets/upload.js)
         html.Div(id='output-image-upload'),
+        # Clicked by assets/upload.js once the first frame has arrived
+        html.Button(id='upload-start', style={'display': 'none'}),
+        # Tail mode: frames written to a server directory are added as they appear
+        html.Div([
+            dcc.Input(id='input-watch-dir', type='text', placeholder='Server directory', style={'width': '60%'}),
+            html.Button('Follow', id='button-watch'),
+            html.Span(id='watch-status', style={'margin-left': '10px'}),
+        ],
+            style={'display': 'block' if settings.MESH_WATCH_ROOTS else 'none', 'margin-top': '10px'}
+        ),
+        html.Div(id='ingest-progress'),
+        dcc.Interval(id='interval-ingest', interval=1000, disabled=True),
+        dcc.Store(id='store-dataset'),
     ],
         style={'width': '100%', 'display': 'inline-block'}
     ),
     html.Div([
         # dcc.Graph(id='matplotlib-graph'),
         html.Img(id='matplotlib-graph', src=''),
+        # WebGL view (drawn in the browser from the stores below)
+        dcc.Graph(id='webgl-graph', style={'display': 'none'}),
+        dcc.Store(id='store-geometry'),
+        dcc.Store(id='store-topology-key'),
+        dcc.Store(id='store-points'),
+        dcc.Store(id='store-points-key'),
+        dcc.Store(id='store-values'),
     ],
         style={'width': '70%', 'display': 'inline-block'}
     ),
@@ -94,6 +592,21 @@ app.layout = html.Div([
                 id='dropdown-system',
             ),
         ]),
+        html.Br(),
+        html.H3('View'),
+        html.Div([
+            dcc.RadioItems(
+                id='radio-view',
+                options=[{'label': 'Image', 'value': 'image'}, {'label': 'WebGL', 'value': 'webgl'}],
+                value='image',
+            ),
+            dcc.Dropdown(
+                id='dropdown-colorscale',
+                options=[{'label': c, 'value': c} for c in ['Jet', 'Viridis', 'Cividis', 'Greys', 'RdBu']],
+                value='Jet',
+                clearable=False,
+            ),
+        ]),
     ],
         style={'width': '30%', 'display': 'inline-block', 'vertical-align': 'top'}
     ),
@@ -107,71 +620,113 @@ app.layout = html.Div([
 ])
 
 
-@app.callback(
+def get_slider_marks(mdata):
+
+    if mdata.time_list is not None:
+        return {i: {'label': '{:g}'.format(t) if t is not None else str(i)} for i, t in enumerate(mdata.time_list)}
+
+    return {i: {'label': '{}'.format(i)} for i in range(mdata.ndata)}
+
+
+@app.expanded_callback(
     [Output('slider_fig_num', 'marks'),
      Output('slider_fig_num', 'min'),
      Output('slider_fig_num', 'max'),
      Output('dropdown-value', 'options'),
-     Output('dropdown-value', 'value')],
-    [Input('upload-image', 'contents')],
-    [State('upload-image', 'filename')],
+     Output('dropdown-value', 'value'),
+     Output('store-dataset', 'data'),
+     Output('watch-status', 'children')],
+    [Input('upload-start', 'n_clicks'),
+     Input('button-watch', 'n_clicks'),
+     Input('interval-ingest', 'n_intervals')],
+    [State('input-watch-dir', 'value'),
+     State('slider_fig_num', 'max')]
 )
-def update_output(list_of_contents, list_of_names):
-    if list_of_contents is not None:
-        list_of_sio = []
-        # Set data
-        mdata.ndata = len(list_of_contents)
-        for c in list_of_contents:
-            _, content_string = c.split(",")
-            decoded = base64.b64decode(content_string)
-            list_of_sio.append(io.StringIO(decoded.decode("utf-8")))
-        data_zipped = zip(list_of_sio, list_of_names)
-        data_zipped = sorted(data_zipped, key=lambda s: int(re.search(r'\d+', s[1]).group()))
-        mdata.ios_list, mdata.file_list = zip(*data_zipped)
-        # Read first data
-        reader.read(copy.copy(mdata.ios_list[0]))
-        mdata.data_dict = reader.get_data_dict()
-        c0_xmin = np.min(reader.Coords[0, :])
-        c0_xmax = np.max(reader.Coords[0, :])
-        c0_ymin = np.min(reader.Coords[1, :])
-        c0_ymax = np.max(reader.Coords[1, :])
-        # Read last data
-        reader.read(copy.copy(mdata.ios_list[-1]))
-        cn_xmin = np.min(reader.Coords[0, :])
-        cn_xmax = np.max(reader.Coords[0, :])
-        cn_ymin = np.min(reader.Coords[1, :])
-        cn_ymax = np.max(reader.Coords[1, :])
-        # Set display area
-        domain = {}
-        domain['xmin'] = min(c0_xmin, cn_xmin)
-        domain['xmax'] = max(c0_xmax, cn_xmax)
-        domain['ymin'] = min(c0_ymin, cn_ymin)
-        domain['ymax'] = max(c0_ymax, cn_ymax)
-        len_x = domain['xmax'] - domain['xmin']
-        len_y = domain['ymax'] - domain['ymin']
-        domain['xmin'] -= 0.1 * len_x
-        domain['xmax'] += 0.1 * len_x
-        domain['ymin'] -= 0.1 * len_y
-        domain['ymax'] += 0.1 * len_y
-        domain['aspect'] = (domain['ymax'] - domain['ymin']) / (domain['xmax'] - domain['xmin'])
-        mdata.domain = domain
-        # Set slider
-        marks = {i: {'label': '{}'.format(i)} for i in range(mdata.ndata)}
+def update_output(n_clicks, n_clicks_watch, n_intervals, watch_dir, max_fig, request=None, callback_context=None, **kwargs):
+    triggered = [t['prop_id'] for t in callback_context.triggered] if callback_context is not None else []
+    watch_status = dash.no_update
+    if 'button-watch.n_clicks' in triggered:
+        # Follow a server directory (previous data of the session is discarded)
+        try:
+            mdata = start_watch(request, watch_dir or '')
+        except ValueError as e:
+            return {}, 0, 0, [{'label': '', 'value': ''}], '', None, str(e)
+        watch_status = 'Following {}'.format(mdata.watch_dir)
+    else:
+        # Dataset of the session (also restored when the page is reloaded)
+        mdata = get_session_data(request)
+
+    if 'interval-ingest.n_intervals' in triggered:
+        # Only the slider range is extended while frames are added
+        if mdata is None:
+            raise PreventUpdate
+        follow_frames(mdata)
+        if mdata.data_dict and mdata.ndata - 1 == max_fig:
+            raise PreventUpdate
+        if mdata.data_dict:
+            return get_slider_marks(mdata), 0, mdata.ndata - 1, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        if all(key is None for key in mdata.hash_list):
+            raise PreventUpdate
+
+    # Read first data (frames not parsed yet or which cannot be read are skipped)
+    reader = None
+    for ifig in range(mdata.ndata if mdata is not None else 0):
+        if mdata.hash_list[ifig] is None:
+            continue
+        try:
+            reader = load_frame(mdata, ifig)
+            break
+        except ValueError:
+            continue
+
+    if reader is not None:
+        if not mdata.data_dict:
+            mdata.update(data_dict=reader.get_data_dict())
         # Set dropdown to select value
         options = [{'label': lbl, 'value': lbl} for lbl in mdata.data_dict.keys()]
         value = list(mdata.data_dict.keys())[0]
-        return marks, 0, mdata.ndata - 1, options, value
+        return get_slider_marks(mdata), 0, mdata.ndata - 1, options, value, mdata.dataset_id, watch_status
+    else:
+        dataset_id = mdata.dataset_id if mdata is not None else None
+        return {}, 0, 0, [{'label': '', 'value': ''}], '', dataset_id, watch_status
+
+
+@app.expanded_callback(
+    [Output('ingest-progress', 'children'),
+     Output('interval-ingest', 'disabled')],
+    [Input('interval-ingest', 'n_intervals'),
+     Input('slider_fig_num', 'max'),
+     Input('store-dataset', 'data')]
+)
+def update_progress(n_intervals, max_fig, dataset_id, request=None, **kwargs):
+    mdata = get_session_data(request)
+    if mdata is None:
+        return '', True
+    # Frames parsed by all workers
+    ndone, ntotal = sum(key is not None for key in mdata.hash_list), mdata.ndata
+    failed = sorted(mdata.errors, key=get_natural_key)
+    errors = ''
+    if len(failed) > 0:
+        errors = ' (cannot read {} files: {})'.format(len(failed), ', '.join(failed[:5] + ['...'] * (len(failed) > 5)))
+    if mdata.watch_dir is not None:
+        # Followed directory is polled until the page is closed
+        return 'Parsed {} / {} frames{}'.format(ndone, ntotal, errors), False
+    if ntotal == 0 and len(failed) == 0 and any(is_archive(name) for name in mdata.upload_files):
+        return 'Reading archive', False
+    if ndone + len(set(failed) & set(mdata.file_list)) < ntotal:
+        return 'Loading files: {} / {}{}'.format(ndone, ntotal, errors), False
     else:
-        return {}, 0, 0, [{'label': '', 'value': ''}], ''
+        return 'Loaded {} files{}'.format(ndone, errors), True
 
 
-@app.callback(
+@app.expanded_callback(
     [Output('dropdown-system', 'options'),
      Output('dropdown-system', 'value')],
     [Input('dropdown-value', 'value')]
 )
-def update_system(value):
-    if value is not None and value != '':
+def update_system(value, request=None, **kwargs):
+    mdata = get_session_data(request)
+    if mdata is not None and value is not None and value != '':
         options = [{'label': str(i + 1), 'value': i + 1} for i in range(mdata.data_dict[value])]
         sys = 0
         return options, sys
@@ -179,34 +734,101 @@ def update_system(value):
         return [{'label': '', 'value': ''}], ''
 
 
-@app.callback(
+@app.expanded_callback(
+    [Output('matplotlib-graph', 'style'),
+     Output('webgl-graph', 'style')],
+    [Input('radio-view', 'value')]
+)
+def update_view(view, **kwargs):
+    if view == 'webgl':
+        return {'display': 'none'}, {'display': 'block'}
+    else:
+        return {'display': 'block'}, {'display': 'none'}
+
+
+@app.expanded_callback(
     Output('matplotlib-graph', 'src'),
     [Input('slider_fig_num', 'value'),
      Input('dropdown-value', 'value'),
-     Input('dropdown-system', 'value')]
+     Input('dropdown-system', 'value'),
+     Input('radio-view', 'value')]
 )
-def update_figure(ifig, tag, sys):
+def update_figure(ifig, tag, sys, view, request=None, **kwargs):
+    mdata = get_session_data(request)
+    if view == 'webgl' or mdata is None:
+        raise PreventUpdate
     if ifig is None:
         ifig = 0
     if tag is not None and tag != '' and sys > 0:
-        # Read vtu data
-        reader.read(copy.copy(mdata.ios_list[ifig]))
-        if tag == 'Mesh':
-            val = None
-        else:
-            val = reader.get_value(tag, system=sys)
-
-        # Figure
-        fig = plt.figure()
-        ax = fig.add_subplot(1, 1, 1)
-        drawer.set_domain(ax, domain=mdata.domain)
-        drawer.draw(coords=reader.Coords, connectivity=reader.Lnodes, value=val)
-        # plotly_fig = mpl_to_plotly(mdata.fig)
-
-        out_img = io.BytesIO()
-        fig.savefig(out_img, format='png')
-        fig.clf()
-        # plt.close('all')
-        out_img.seek(0)  # rewind file
-        encoded = base64.b64encode(out_img.read()).decode("ascii").replace("\n", "")
-        return "data:image/png;base64,{}".format(encoded)
+        # Frames which cannot be read are reported by the progress
+        try:
+            key, out_img = render_frame(mdata, ifig, tag, sys)
+        except ValueError:
+            raise PreventUpdate
+        # Display range is not final yet: the image is sent inline (not cached)
+        if key is None:
+            return 'data:image/png;base64,' + base64.b64encode(out_img).decode()
+        # Neighboring frames are rendered in the background (requests of the previous selection are cancelled)
+        if mdata.prefetcher is None:
+            mdata.prefetcher = FramePrefetcher(prefetch_executor, settings.MESH_PREFETCH_WINDOW)
+        mdata.prefetcher.schedule(lambda jfig: render_frame(mdata, jfig, tag, sys), ifig, mdata.ndata,
+                                  ready=lambda jfig: mdata.hash_list[jfig] is not None)
+        # Image is served (and cached by the browser) under its content-addressed URL
+        return reverse('mesh:image', args=[key])
+
+
+@app.expanded_callback(
+    [Output('store-geometry', 'data'),
+     Output('store-topology-key', 'data'),
+     Output('store-points', 'data'),
+     Output('store-points-key', 'data'),
+     Output('store-values', 'data')],
+    [Input('slider_fig_num', 'value'),
+     Input('dropdown-value', 'value'),
+     Input('dropdown-system', 'value'),
+     Input('radio-view', 'value')],
+    [State('store-topology-key', 'data'),
+     State('store-points-key', 'data')]
+)
+def update_webgl(ifig, tag, sys, view, topology_key, points_key, request=None, **kwargs):
+    mdata = get_session_data(request)
+    if view != 'webgl' or mdata is None or tag is None or tag == '' or not sys:
+        raise PreventUpdate
+    if ifig is None:
+        ifig = 0
+    try:
+        reader = load_frame(mdata, ifig)
+    except ValueError:
+        raise PreventUpdate
+
+    # Triangles are sent once per topology and node positions when they move
+    geometry_data = dash.no_update
+    new_topology_key = reader.Lnodes.get_hash() if reader.Lnodes is not None else ''
+    if new_topology_key != topology_key:
+        geometry = get_geometry(reader.Lnodes)
+        geometry_data = get_geometry_payload(new_topology_key, geometry)
+        if geometry is not None:
+            geometry_cache.put(new_topology_key, geometry)
+    points_data = dash.no_update
+    new_points_key = get_points_key(reader.Coords)
+    if new_points_key != points_key:
+        points_data = get_points_payload(new_points_key, reader.Coords)
+
+    # Values of every frame (quantized in the common color range)
+    values_data = None
+    if tag != 'Mesh':
+        vrange = mdata.statistics.get_range(tag, sys, percentiles=settings.MESH_COLOR_PERCENTILES)
+        values_data = get_values_payload(get_value(mdata, ifig, tag, sys), vrange)
+
+    return geometry_data, new_topology_key, points_data, new_points_key, values_data
+
+
+# Colormap, zoom and pan are handled in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace='mesh', function_name='render'),
+    Output('webgl-graph', 'figure'),
+    [Input('store-geometry', 'data'),
+     Input('store-points', 'data'),
+     Input('store-values', 'data'),
+     Input('dropdown-colorscale', 'value')]
+)
@@ -0,0 +1,73 @@
+import shutil
+import tarfile
+import zipfile
+
+from .storage import atomic_write
+
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+def is_archive(name):
+
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class MeshArchive:
+    """
+    Zip or tar archive of mesh files (members are decompressed one at a time)
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.zip = None
+        self.tar = None
+
+        # Listing reads the central directory (zip) or the member headers (tar)
+        try:
+            if zipfile.is_zipfile(path):
+                self.zip = zipfile.ZipFile(path)
+                self.members = [info for info in self.zip.infolist() if not info.is_dir()]
+            else:
+                self.tar = tarfile.open(path, 'r:*')
+                self.members = [info for info in self.tar.getmembers() if info.isfile()]
+        except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+            raise ValueError('Invalid archive: {}'.format(e))
+
+    def get_name(self, member):
+
+        return member.filename if self.zip is not None else member.name
+
+    def open(self, member):
+
+        if self.zip is not None:
+            return self.zip.open(member)
+
+        return self.tar.extractfile(member)
+
+    def read(self, member):
+
+        with self.open(member) as f:
+            return f.read()
+
+    def extract(self, member, path, *, buffer_size=1 << 20):
+
+        # Member is copied in small pieces (never held in memory as a whole)
+        with self.open(member) as src, atomic_write(path) as dst:
+            shutil.copyfileobj(src, dst, buffer_size)
+
+    def close(self):
+
+        if self.zip is not None:
+            self.zip.close()
+        if self.tar is not None:
+            self.tar.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
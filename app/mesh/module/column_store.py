@@ -0,0 +1,138 @@
+import contextlib
+import fcntl
+import json
+import os
+import threading
+
+import numpy as np
+
+from .storage import atomic_write
+
+
+class ColumnStore:
+    """
+    Fields of all frames of a dataset: one memory-mapped array per field (frames x cells x systems) in chunks of frames
+    """
+
+    def __init__(self, root, chunk_frames=16):
+
+        self.root = root
+        self.chunk_frames = chunk_frames
+
+        # Field -> {'name', 'ncells', 'nsys', 'dtype'} (set by the first frame written)
+        self.layout = {}
+
+        # Open chunks: (tag, chunk index) -> (values, filled)
+        self.chunks = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lock_layout(self):
+
+        # Frames are written by the workers which parsed them
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'columns.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def get_layout_path(self):
+
+        return os.path.join(self.root, 'columns.json')
+
+    def load_layout(self):
+
+        try:
+            with open(self.get_layout_path()) as f:
+                self.layout = json.load(f)
+        except FileNotFoundError:
+            pass
+
+    def get_field_layout(self, tag, *, field=None):
+
+        if tag not in self.layout:
+            self.load_layout()
+        if tag in self.layout or field is None:
+            return self.layout.get(tag)
+
+        # Layout of a new field
+        with self.lock_layout():
+            self.load_layout()
+            if tag not in self.layout:
+                self.layout[tag] = {
+                    'name': 'field_{}'.format(len(self.layout)),
+                    'ncells': field.shape[0],
+                    'nsys': field.shape[1],
+                    'dtype': field.dtype.str,
+                }
+                with atomic_write(self.get_layout_path(), 'w') as f:
+                    json.dump(self.layout, f)
+
+        return self.layout[tag]
+
+    def get_chunk(self, tag, ichunk, *, create=False):
+
+        chunk = self.chunks.get((tag, ichunk))
+        if chunk is not None:
+            return chunk
+
+        layout = self.get_field_layout(tag)
+        if layout is None:
+            return None
+        path = os.path.join(self.root, '{}_{}.npy'.format(layout['name'], ichunk))
+        filled_path = os.path.join(self.root, '{}_{}_filled.npy'.format(layout['name'], ichunk))
+
+        if not os.path.exists(filled_path):
+            if not create:
+                return None
+            # Files are sparse until frames are written
+            with self.lock_layout():
+                if not os.path.exists(filled_path):
+                    shape = (self.chunk_frames, layout['ncells'], layout['nsys'])
+                    np.lib.format.open_memmap(path, mode='w+', dtype=layout['dtype'], shape=shape).flush()
+                    with atomic_write(filled_path) as f:
+                        np.save(f, np.zeros(self.chunk_frames, dtype='uint8'))
+
+        chunk = (np.load(path, mmap_mode='r+'), np.load(filled_path, mmap_mode='r+'))
+        with self.lock:
+            chunk = self.chunks.setdefault((tag, ichunk), chunk)
+
+        return chunk
+
+    def put_frame(self, ifig, fields):
+
+        ichunk, iframe = divmod(ifig, self.chunk_frames)
+        for tag, field in fields.items():
+            layout = self.get_field_layout(tag, field=field)
+            # Frames with another number of cells or systems are read from their own arrays
+            if field.shape != (layout['ncells'], layout['nsys']):
+                continue
+            values, filled = self.get_chunk(tag, ichunk, create=True)
+            values[iframe] = field
+            values.flush()
+            filled[iframe] = 1
+            filled.flush()
+
+    def get_frame(self, tag, ifig, system):
+
+        # Values of one system in one frame (view of the chunk)
+        ichunk, iframe = divmod(ifig, self.chunk_frames)
+        chunk = self.get_chunk(tag, ichunk)
+        if chunk is None or not chunk[1][iframe]:
+            return None
+
+        return chunk[0][iframe, :, system - 1]
+
+    def get_cell(self, tag, icell, system, nframes):
+
+        # Values of one cell in all frames (NaN for frames not written)
+        history = np.full(nframes, np.nan)
+        for ichunk in range((nframes + self.chunk_frames - 1) // self.chunk_frames):
+            chunk = self.get_chunk(tag, ichunk)
+            if chunk is None:
+                continue
+            start = ichunk * self.chunk_frames
+            stop = min(start + self.chunk_frames, nframes)
+            filled = chunk[1][:stop - start].astype(bool)
+            history[start:stop][filled] = chunk[0][:stop - start, icell, system - 1][filled]
+
+        return history
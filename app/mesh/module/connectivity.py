@@ -0,0 +1,117 @@
+import hashlib
+
+import numpy as np
+
+
+class CellConnectivity:
+    """
+    Cell connectivity in CSR format (flat node indices and offsets)
+    """
+
+    # Number of corner nodes by VTK cell type
+    corner_nodes = {
+        1: 1,   # VTK_VERTEX
+        3: 2,   # VTK_LINE
+        5: 3,   # VTK_TRIANGLE
+        9: 4,   # VTK_QUAD
+        21: 2,  # VTK_QUADRATIC_EDGE
+        22: 3,  # VTK_QUADRATIC_TRIANGLE
+        23: 4,  # VTK_QUADRATIC_QUAD
+        28: 4,  # VTK_BIQUADRATIC_QUAD
+    }
+
+    def __init__(self, indices, offsets, types=None):
+
+        # offsets[i]:offsets[i + 1] are the nodes of cell i
+        self.indices = indices
+        self.offsets = offsets
+        self.types = types
+
+        # Hash of the topology (computed on first use)
+        self.hash = None
+
+    @classmethod
+    def from_vtk(cls, connectivity, offsets=None, types=None, *, ncells):
+
+        # VTK offsets give the end of each cell
+        if offsets is None:
+            offsets = np.arange(1, ncells + 1) * (connectivity.size // max(ncells, 1))
+        dtype = 'int32' if connectivity.size < 2 ** 31 else 'int64'
+        csr_offsets = np.zeros(ncells + 1, dtype=dtype)
+        csr_offsets[1:] = offsets
+
+        return cls(connectivity.astype(dtype, copy=False), csr_offsets, types)
+
+    @property
+    def ncells(self):
+
+        return self.offsets.size - 1
+
+    def get_sizes(self):
+
+        return np.diff(self.offsets)
+
+    def arrays(self):
+
+        return [a for a in (self.indices, self.offsets, self.types) if a is not None]
+
+    def get_hash(self):
+
+        if self.hash is None:
+            sha1 = hashlib.sha1()
+            for array in (self.indices, self.offsets, self.types):
+                if array is not None:
+                    sha1.update(np.ascontiguousarray(array).data)
+                sha1.update(b'|')
+            self.hash = sha1.hexdigest()
+
+        return self.hash
+
+    def is_point_cloud(self):
+
+        return bool(np.all(self.get_sizes() == 1))
+
+    def get_ncorners(self, cell_type, nnodes):
+
+        ncorners = self.corner_nodes.get(cell_type)
+        if ncorners is not None:
+            return ncorners
+
+        # Unknown type: guess from the number of nodes
+        if nnodes == 6 or nnodes == 10:
+            return 3
+        elif nnodes == 4 or nnodes == 8 or nnodes == 12 or nnodes == 16:
+            return 4
+
+        return nnodes
+
+    def groups(self):
+
+        # Split cells by (type, number of nodes)
+        sizes = self.get_sizes()
+        types = self.types if self.types is not None else np.full(self.ncells, -1)
+        keys = types.astype('int64') * (int(sizes.max(initial=0)) + 1) + sizes
+        if keys.size > 0 and keys.min() == keys.max():
+            ukeys, inverse = keys[:1], None
+        else:
+            ukeys, inverse = np.unique(keys, return_inverse=True)
+
+        for ikey in range(ukeys.size):
+            if ukeys.size == 1:
+                cells = slice(None)
+                cell_type = int(types[0])
+                nnodes = int(sizes[0])
+                lnodes = self.indices.reshape(self.ncells, nnodes)
+            else:
+                cells = np.flatnonzero(inverse == ikey)
+                cell_type = int(types[cells[0]])
+                nnodes = int(sizes[cells[0]])
+                lnodes = self.indices[self.offsets[cells][:, None] + np.arange(nnodes)]
+            yield cell_type, cells, lnodes
+
+    def corner_groups(self):
+
+        # Corner nodes only (mid-side nodes are dropped)
+        for cell_type, cells, lnodes in self.groups():
+            ncorners = self.get_ncorners(cell_type, lnodes.shape[1])
+            yield cells, lnodes[:, :ncorners]
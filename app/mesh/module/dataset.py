@@ -0,0 +1,399 @@
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+from .statistics import DatasetStatistics
+from .storage import atomic_write, evict_lru
+
+
+class MeshData:
+    """
+    Dataset of a session (frame arrays are shared by all workers through the on-disk caches)
+    """
+
+    # Attributes kept in the manifest (read by workers other than the one which received the files)
+    manifest_attributes = ['ndata', 'file_list', 'path_list', 'hash_list', 'time_list', 'data_dict', 'upload_files', 'watch_dir', 'errors']
+
+    def __init__(self, dataset_id, dataset_dir):
+
+        self.dataset_id = dataset_id
+        self.dataset_dir = dataset_dir
+
+        # VTK data
+        self.ndata = 0
+        self.file_list = []
+        self.path_list = []
+        self.hash_list = []
+        self.time_list = None
+        self.data_dict = {}
+
+        # Files which could not be read (name -> message)
+        self.errors = {}
+
+        # Files sent in chunks by the client (name -> size)
+        self.upload_files = {}
+
+        # Server directory followed for new frames (tail mode)
+        self.watch_dir = None
+        self.last_scan = 0.
+
+        # Bounds and value distributions of all frames (final once every frame is ingested)
+        self.statistics = DatasetStatistics()
+        self.statistics_frozen = False
+
+        # Parallel parsing of the frames received by this worker
+        self.ingestion = None
+
+        # Fields of all frames (frames x cells x systems)
+        self.columns = None
+
+        # Background rendering of neighboring frames
+        self.prefetcher = None
+
+        self.removed = False
+        self.lock = threading.Lock()
+
+    def get_manifest_path(self):
+
+        return os.path.join(self.dataset_dir, 'dataset.json')
+
+    @contextlib.contextmanager
+    def lock_manifest(self):
+
+        # Workers updating the same dataset (frames are parsed by the worker which received their files)
+        with open(os.path.join(self.dataset_dir, 'dataset.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def update(self, **attributes):
+
+        with self.lock_manifest():
+            self.load()
+            for name, value in attributes.items():
+                setattr(self, name, value)
+            self.save()
+
+    def get_statistics_path(self, ifig):
+
+        return os.path.join(self.dataset_dir, 'statistics', '{}.json'.format(ifig))
+
+    def set_frame(self, ifig, result):
+
+        # Statistics are kept with the dataset (frame arrays may be evicted from the cache)
+        self.statistics.add_frame(ifig, result['statistics'])
+        path = self.get_statistics_path(ifig)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path, 'w') as f:
+            json.dump(result['statistics'], f)
+
+        with self.lock_manifest():
+            self.load()
+            self.hash_list[ifig] = result['key']
+            self.save()
+
+    def set_error(self, name, message):
+
+        with self.lock_manifest():
+            self.load()
+            self.errors[name] = message
+            self.save()
+
+    def get_error(self, ifig):
+
+        message = self.errors.get(self.file_list[ifig])
+        if message is None:
+            return None
+
+        return ValueError('Cannot read {}: {}'.format(self.file_list[ifig], message))
+
+    def add_frames(self, names, paths, times=None):
+
+        # New frames are appended (frames already in the dataset keep their index and parsed arrays)
+        with self.lock_manifest():
+            self.load()
+            known = set(self.file_list)
+            for i, name in enumerate(names):
+                if name in known:
+                    continue
+                self.file_list.append(name)
+                self.path_list.append(paths[i])
+                self.hash_list.append(None)
+                if self.time_list is not None:
+                    self.time_list.append(times[i] if times is not None else None)
+            self.ndata = len(self.file_list)
+            self.save()
+
+    def get_claim_path(self, ifig):
+
+        return os.path.join(self.dataset_dir, '{}.ingest'.format(ifig))
+
+    def claim_frame(self, ifig, *, timeout):
+
+        # Only one worker parses a frame (claims of workers which died are taken over)
+        path = self.get_claim_path(ifig)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if self.is_claimed(ifig, timeout=timeout):
+                return False
+            # Stale claim is removed by one worker (checked again under the lock)
+            with self.lock_manifest():
+                if self.is_claimed(ifig, timeout=timeout):
+                    return False
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                try:
+                    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    return False
+
+        with os.fdopen(fd, 'w') as f:
+            f.write('{} {}'.format(socket.gethostname(), os.getpid()))
+
+        return True
+
+    def is_claimed(self, ifig, *, timeout):
+
+        # Claim is alive while its process runs (same host) and for timeout seconds
+        path = self.get_claim_path(ifig)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path) as f:
+                owner = f.read().split()
+        except FileNotFoundError:
+            return False
+        if time.time() - mtime > timeout:
+            return False
+        if len(owner) == 2 and owner[0] == socket.gethostname():
+            try:
+                os.kill(int(owner[1]), 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                pass
+
+        return True
+
+    def save(self):
+
+        with self.lock:
+            if self.removed:
+                return
+            manifest = {name: getattr(self, name) for name in self.manifest_attributes}
+            with atomic_write(self.get_manifest_path(), 'w') as f:
+                json.dump(manifest, f)
+
+    def load(self):
+
+        try:
+            with open(self.get_manifest_path()) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        with self.lock:
+            for name in self.manifest_attributes:
+                setattr(self, name, manifest.get(name, getattr(self, name)))
+
+        # Statistics of parsed frames
+        for ifig, key in enumerate(self.hash_list):
+            if key is not None and ifig not in self.statistics.frames:
+                try:
+                    with open(self.get_statistics_path(ifig)) as f:
+                        self.statistics.add_frame(ifig, json.load(f))
+                except FileNotFoundError:
+                    continue
+
+        return True
+
+    def wait_frame(self, ifig, *, timeout, interval=0.2):
+
+        # Frame parsed by another worker: wait until it appears in the manifest
+        deadline = time.monotonic() + timeout
+        while self.hash_list[ifig] is None:
+            error = self.get_error(ifig)
+            if error is not None:
+                raise error
+            if time.monotonic() > deadline:
+                raise TimeoutError('Frame {} of dataset {} is not ingested'.format(ifig, self.dataset_id))
+            time.sleep(interval)
+            self.load()
+
+        return self.hash_list[ifig]
+
+    def close(self):
+
+        with self.lock:
+            self.removed = True
+        if self.ingestion is not None:
+            self.ingestion.cancel()
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+
+
+class DatasetRegistry:
+    """
+    Datasets of all sessions (manifests on disk, opened by any worker)
+    """
+
+    def __init__(self, root, ttl, *, max_bytes=None, caches=(), eviction_interval=60.):
+
+        self.root = root
+
+        # On-disk caches evicted at the same interval (they grow with long sessions and tail mode)
+        self.caches = caches
+
+        # Datasets not accessed for ttl seconds are removed (and the least recently used ones above max_bytes)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.eviction_interval = eviction_interval
+        self.last_eviction = 0.
+
+        # Datasets opened in this process
+        self.datasets = {}
+        self.lock = threading.Lock()
+
+    def create(self):
+
+        dataset_id = uuid.uuid4().hex
+        dataset_dir = os.path.join(self.root, dataset_id)
+        os.makedirs(dataset_dir, exist_ok=True)
+        mdata = MeshData(dataset_id, dataset_dir)
+        with self.lock:
+            self.datasets[dataset_id] = mdata
+
+        return mdata
+
+    def get(self, dataset_id):
+
+        if dataset_id is None:
+            return None
+
+        with self.lock:
+            mdata = self.datasets.get(dataset_id)
+
+        # Dataset created by another worker
+        if mdata is None:
+            mdata = MeshData(dataset_id, os.path.join(self.root, dataset_id))
+            if not mdata.load():
+                return None
+            with self.lock:
+                mdata = self.datasets.setdefault(dataset_id, mdata)
+
+        self.touch(mdata)
+
+        return mdata
+
+    def get_session_path(self, session_key):
+
+        return os.path.join(self.root, '{}.session'.format(session_key))
+
+    def get_session_dataset(self, session_key):
+
+        # Dataset of a browser session (kept out of the session state written back by every callback)
+        if session_key is None:
+            return None
+        path = self.get_session_path(session_key)
+        try:
+            with open(path) as f:
+                dataset_id = f.read().strip()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return dataset_id or None
+
+    def set_session_dataset(self, session_key, dataset_id):
+
+        os.makedirs(self.root, exist_ok=True)
+        with atomic_write(self.get_session_path(session_key), 'w') as f:
+            f.write(dataset_id)
+
+    def touch(self, mdata):
+
+        # mtime of the manifest records the last access (TTL)
+        try:
+            os.utime(mdata.get_manifest_path())
+        except FileNotFoundError:
+            pass
+
+    def remove(self, dataset_id):
+
+        if dataset_id is None:
+            return
+
+        with self.lock:
+            mdata = self.datasets.pop(dataset_id, None)
+        if mdata is not None:
+            mdata.close()
+        shutil.rmtree(os.path.join(self.root, dataset_id), ignore_errors=True)
+
+    def get_size(self, path):
+
+        # Allocated size (chunks of the field columns are sparse until their frames are written)
+        size = 0
+        for directory, _, names in os.walk(path):
+            for name in names:
+                try:
+                    size += os.stat(os.path.join(directory, name)).st_blocks * 512
+                except FileNotFoundError:
+                    pass
+
+        return size
+
+    def evict(self):
+
+        # At most once per eviction interval
+        now = time.time()
+        with self.lock:
+            if now - self.last_eviction < self.eviction_interval:
+                return []
+            self.last_eviction = now
+
+        for cache in self.caches:
+            cache.evict()
+
+        if not os.path.isdir(self.root):
+            return []
+
+        removed = []
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                # Sessions idle for longer than the TTL
+                try:
+                    if entry.name.endswith('.session') and now - entry.stat().st_mtime > self.ttl:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                mtime = os.stat(os.path.join(entry.path, 'dataset.json')).st_mtime
+            except FileNotFoundError:
+                mtime = entry.stat().st_mtime
+            if now - mtime > self.ttl:
+                self.remove(entry.name)
+                removed.append(entry.name)
+            elif self.max_bytes is not None:
+                entries.append((mtime, entry.name, self.get_size(entry.path)))
+
+        # Least recently used datasets above max_bytes (the last accessed one is kept)
+        if self.max_bytes is not None:
+            removed += evict_lru(entries, self.max_bytes, self.remove, keep=1)
+
+        # Datasets removed by other workers
+        with self.lock:
+            closed = [i for i, mdata in self.datasets.items() if not os.path.isdir(mdata.dataset_dir)]
+        for dataset_id in closed:
+            self.remove(dataset_id)
+            removed.append(dataset_id)
+
+        return removed
@@ -1,11 +1,19 @@
 import numpy as np
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 import matplotlib.tri as mtri
 
+from .rasterizer import MeshRasterizer
+from .geometry import MeshGeometry
+
 
 class DrawMesh:
 
+    def __init__(self, *, engine='matplotlib'):
+
+        # Render engine of cell values ('matplotlib' or 'raster')
+        self.engine = engine
+        self.rasterizer = MeshRasterizer()
+
     def set_domain(self, ax, *, domain):
 
         # Set display area
@@ -19,6 +27,14 @@ class DrawMesh:
 
         self.set_mpl_params(ax)
 
+    def set_range(self, vmin, vmax):
+
+        # Color range common to all frames
+        self.vmin = vmin
+        self.vmax = vmax
+
+        self.isSetRange = True
+
     def set_mpl_params(self, ax):
 
         self.ax = ax
@@ -36,9 +52,8 @@ class DrawMesh:
         self.ax.spines['left'].set_visible(False)
         self.ax.spines['right'].set_visible(False)
 
-    def polyplot(self, coords, connectivity, value=None, **kwargs):
+    def polyplot(self, vertices, value=None, **kwargs):
 
-        vertices = coords[:2, :].T[np.asarray(connectivity)]
         pcm = mpl.collections.PolyCollection(vertices, **kwargs)
         if value is not None:
             pcm.set_array(value)
@@ -46,7 +61,31 @@ class DrawMesh:
             pcm.set_clim(vmin=self.vmin, vmax=self.vmax)
         self.ax.add_collection(pcm)
 
-    def draw(self, *, coords, connectivity, value=None):
+    def get_norm(self, value):
+
+        # Common color range for all cell groups
+        if self.isSetRange:
+            return mpl.colors.Normalize(vmin=self.vmin, vmax=self.vmax)
+        else:
+            return mpl.colors.Normalize(vmin=np.nanmin(value), vmax=np.nanmax(value))
+
+    def get_image_shape(self):
+
+        # Size of the axes in pixels (after the aspect is applied)
+        self.ax.apply_aspect()
+        bbox = self.ax.get_window_extent()
+
+        return max(int(round(bbox.height)), 1), max(int(round(bbox.width)), 1)
+
+    def rasterize(self, coords, geometry, value, *, norm, cmap):
+
+        # Cells are drawn into an image covering the display area
+        extent = (self.xmin, self.xmax, self.ymin, self.ymax)
+        image = self.rasterizer.rasterize(coords, geometry, value, extent=extent, shape=self.get_image_shape())
+        rgba = self.rasterizer.colorize(image, norm=norm, cmap=cmap)
+        self.ax.imshow(rgba, extent=extent, origin='upper', interpolation='nearest')
+
+    def draw(self, *, coords, connectivity, value=None, geometry=None):
 
         edge_color = None
         marker_size = 1
@@ -55,24 +94,35 @@ class DrawMesh:
 
         self.ax.set_aspect('equal')
 
-        nnodes = connectivity.shape[1]
-        if nnodes == 6 or nnodes == 10:
-            connectivity = connectivity[:, :3]
-        elif nnodes == 4 or nnodes == 8 or nnodes == 12 or nnodes == 16:
-            connectivity = connectivity[:, :4]
+        # Geometry is shared by frames with the same connectivity
+        if geometry is None and connectivity is not None:
+            geometry = MeshGeometry(connectivity)
 
-        if value is None:
+        if geometry is None or geometry.point_cloud:
+            if value is None:
+                self.ax.scatter(coords[0, :], coords[1, :], c='k', s=marker_size)
+            elif self.isSetRange:
+                self.ax.scatter(coords[0, :], coords[1, :], c=value, cmap=cmap, vmin=self.vmin, vmax=self.vmax, s=marker_size)
+            else:
+                self.ax.scatter(coords[0, :], coords[1, :], c=value, cmap=cmap, s=marker_size)
+        elif value is None:
             if edge_color is None:
                 edge_color = 'k'
-            self.polyplot(coords=coords, connectivity=connectivity, edgecolors=edge_color, facecolor="None", cmap=cmap)
+            for _, vertices in geometry.get_vertices(coords):
+                self.polyplot(vertices, edgecolors=edge_color, facecolor="None", cmap=cmap)
+        elif self.engine == 'raster':
+            norm = self.get_norm(value)
+            # Colorbar first: the image is rasterized at the final size of the axes
+            if show_colorbar:
+                mappable = mpl.cm.ScalarMappable(norm=norm, cmap=cmap)
+                mappable.set_array(np.array([]))
+                self.ax.figure.colorbar(mappable, ax=self.ax, orientation='vertical')
+            self.rasterize(coords, geometry, value, norm=norm, cmap=cmap)
         else:
-            if connectivity is None or connectivity.shape[1] == 1:
-                if self.isSetRange:
-                    self.ax.scatter(coords[0, :], coords[1, :], c=value, cmap=cmap, vmin=self.vmin, vmax=self.vmax, s=marker_size)
-                else:
-                    self.ax.scatter(coords[0, :], coords[1, :], c=value, cmap=cmap, s=marker_size)
-            else:
-                self.polyplot(coords=coords, connectivity=connectivity, value=value, edgecolors=edge_color, cmap=cmap)
-                if show_colorbar:
-                    pcm = self.ax.get_children()[0]
-                    plt.colorbar(pcm, ax=self.ax, orientation='vertical')
+            # One collection per element type
+            norm = self.get_norm(value)
+            for cells, vertices in geometry.get_vertices(coords):
+                self.polyplot(vertices, value=value[cells], edgecolors=edge_color, cmap=cmap, norm=norm)
+            if show_colorbar:
+                pcm = self.ax.get_children()[0]
+                self.ax.figure.colorbar(pcm, ax=self.ax, orientation='vertical')
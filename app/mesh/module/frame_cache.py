@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    LRU cache of parsed frames bounded by memory usage (and by the # of frames: memory-mapped arrays are not counted)
+    """
+
+    def __init__(self, max_bytes, max_frames=None):
+
+        self.max_bytes = max_bytes
+        self.max_frames = max_frames
+
+        # key -> frame (most recently used at the end)
+        self.frames = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def get(self, key):
+
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+            else:
+                self.frames.move_to_end(key)
+                self.hits += 1
+
+        return frame
+
+    def put(self, key, frame):
+
+        # Calling put again for a cached key updates its size
+        size = self.sizeof(frame)
+        with self.lock:
+            if key in self.frames:
+                self.nbytes -= self.sizes[key]
+            self.frames[key] = frame
+            self.frames.move_to_end(key)
+            self.sizes[key] = size
+            self.nbytes += size
+            self.evict()
+
+    def evict(self):
+
+        # Keep at least the frame just inserted
+        while (self.nbytes > self.max_bytes or (self.max_frames is not None and len(self.frames) > self.max_frames)) and len(self.frames) > 1:
+            key, _ = self.frames.popitem(last=False)
+            self.nbytes -= self.sizes.pop(key)
+
+    def discard(self, dataset):
+
+        with self.lock:
+            for key in [k for k in self.frames if k[0] == dataset]:
+                del self.frames[key]
+                self.nbytes -= self.sizes.pop(key)
+
+    def sizeof(self, frame):
+
+        if isinstance(frame, (bytes, bytearray)):
+            return len(frame)
+
+        return frame.nbytes()
+
+    def get_stats(self):
+
+        with self.lock:
+            return {
+                'frames': len(self.frames),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'max_frames': self.max_frames,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class MeshGeometry:
+    """
+    Drawing geometry of a connectivity (shared by frames with the same topology)
+    """
+
+    def __init__(self, connectivity):
+
+        self.point_cloud = connectivity.is_point_cloud()
+
+        # Corner nodes of each group of cells (mid-side nodes dropped)
+        self.groups = []
+        if not self.point_cloud:
+            for cells, lnodes in connectivity.corner_groups():
+                self.groups.append((cells, np.ascontiguousarray(lnodes)))
+
+        # Corner-major node indices: (# of corners, # of cells)
+        self.corner_nodes = [np.ascontiguousarray(lnodes.T) for _, lnodes in self.groups]
+
+        # Triangles (fan split of the cells) and their cells (built on first use)
+        self.ncells = connectivity.ncells
+        self.triangles = None
+        self.triangle_cells = None
+
+    def get_vertices(self, coords):
+
+        # Polygons of each group for the current node positions
+        xy = np.ascontiguousarray(coords[:2, :].T)
+        for cells, lnodes in self.groups:
+            yield cells, xy[lnodes]
+
+    def get_triangles(self):
+
+        if self.triangles is None:
+            triangles = [np.zeros((0, 3), dtype='int32')]
+            triangle_cells = [np.zeros(0, dtype='int32')]
+            for cells, lnodes in self.groups:
+                if lnodes.shape[1] < 3:
+                    continue
+                cell_ids = np.arange(self.ncells)[cells].astype('int32')
+                for icorner in range(1, lnodes.shape[1] - 1):
+                    triangles.append(lnodes[:, [0, icorner, icorner + 1]].astype('int32'))
+                    triangle_cells.append(cell_ids)
+            self.triangles = np.concatenate(triangles)
+            self.triangle_cells = np.concatenate(triangle_cells)
+
+        return self.triangles, self.triangle_cells
+
+    def nbytes(self):
+
+        size = 0
+        for cells, lnodes in self.groups:
+            size += lnodes.nbytes
+            if not isinstance(cells, slice):
+                size += cells.nbytes
+        for corner_nodes in self.corner_nodes:
+            size += corner_nodes.nbytes
+        if self.triangles is not None:
+            size += self.triangles.nbytes + self.triangle_cells.nbytes
+
+        return size
@@ -0,0 +1,63 @@
+import contextlib
+import os
+import threading
+
+from .storage import atomic_write, evict_lru, scan_sharded
+
+
+class ImageStore:
+    """
+    Rendered images stored as files (sent by the web server)
+    """
+
+    def __init__(self, root, max_bytes=None):
+
+        self.root = root
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+
+    def get_name(self, key):
+
+        return '{}/{}.png'.format(key[:2], key)
+
+    def get_path(self, key):
+
+        return os.path.join(self.root, key[:2], key + '.png')
+
+    def exists(self, key):
+
+        return os.path.exists(self.get_path(key))
+
+    def put(self, key, image):
+
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(image)
+
+    def touch(self, key):
+
+        # mtime records the last access (LRU)
+        try:
+            os.utime(self.get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+
+        if self.max_bytes is None:
+            return
+
+        with self.lock:
+            entries = []
+            for entry in scan_sharded(self.root):
+                if entry.is_file() and entry.name.endswith('.png'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+            evict_lru(entries, self.max_bytes, self.remove_file)
+
+    def remove_file(self, path):
+
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
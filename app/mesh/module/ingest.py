@@ -0,0 +1,100 @@
+import concurrent.futures
+import json
+import os
+import threading
+
+from .vtu_reader import VtkReader
+from .pvtu_reader import PvtuReader
+from .npy_cache import NpyCache
+from .statistics import compute_frame_statistics
+from .storage import atomic_write
+from .topology import TopologyStore
+
+
+def create_reader(path):
+
+    if path.lower().endswith('.pvtu'):
+        return PvtuReader()
+
+    return VtkReader()
+
+
+def ingest_frame(path, cache_root, topology_root):
+
+    # Parse all arrays of the frame file into the on-disk cache
+    npy_cache = NpyCache(cache_root)
+    reader = create_reader(path)
+    if isinstance(reader, PvtuReader):
+        key = npy_cache.hash_files([path] + reader.get_sources(path))
+    else:
+        key = npy_cache.hash_files([path])
+    cache_dir = npy_cache.frame_dir(key)
+    reader.read(path, cache_dir=cache_dir, topology=TopologyStore(topology_root))
+    reader.read_all_fields()
+
+    # Bounds and value distributions are computed once per file content
+    stats_path = os.path.join(cache_dir, 'statistics.json')
+    if os.path.exists(stats_path):
+        with open(stats_path) as f:
+            stats = json.load(f)
+    else:
+        stats = compute_frame_statistics(reader)
+        with atomic_write(stats_path, 'w') as f:
+            json.dump(stats, f)
+
+    return {'key': key, 'statistics': stats}
+
+
+class FrameIngestion:
+    """
+    Parallel ingestion of the frames of a dataset (frames submitted by this worker)
+    """
+
+    def __init__(self, executor, cache_root, topology_root):
+
+        self.executor = executor
+        self.cache_root = cache_root
+        self.topology_root = topology_root
+
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def submit(self, ifig, path, *, on_done=None, on_error=None):
+
+        future = self.executor.submit(ingest_frame, path, self.cache_root, self.topology_root)
+        with self.lock:
+            self.futures[ifig] = future
+        future.add_done_callback(lambda f: self.done(f, ifig, on_done, on_error))
+
+    def done(self, future, ifig, on_done, on_error):
+
+        if future.cancelled():
+            return
+
+        # Frames which cannot be parsed are reported (waiting for them would never end)
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(ifig, error)
+        elif on_done is not None:
+            on_done(ifig, future.result())
+
+    def wait(self, ifig, *, timeout=None):
+
+        # None unless the frame was submitted by this worker
+        with self.lock:
+            future = self.futures.get(ifig)
+        if future is None:
+            return None
+
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError('Frame {} is not ingested'.format(ifig))
+
+    def cancel(self):
+
+        with self.lock:
+            futures = list(self.futures.values())
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from .storage import evict_lru, scan_sharded
+
+
+class NpyCache:
+    """
+    On-disk cache of parsed frames (one directory of .npy files per file content)
+    """
+
+    def __init__(self, root, max_bytes=None):
+
+        self.root = root
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+
+    def hash_files(self, paths):
+
+        # Hash of the concatenated contents of several files
+        sha1 = hashlib.sha1()
+        for path in paths:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha1.update(chunk)
+
+        return sha1.hexdigest()
+
+    def frame_dir(self, key):
+
+        path = os.path.join(self.root, key[:2], key)
+        os.makedirs(path, exist_ok=True)
+
+        # mtime of the directory records the last access (LRU)
+        os.utime(path)
+
+        return path
+
+    def get_size(self, path):
+
+        size = 0
+        for entry in os.scandir(path):
+            if entry.is_file():
+                size += entry.stat().st_size
+
+        return size
+
+    def evict(self):
+
+        if self.max_bytes is None:
+            return
+
+        with self.lock:
+            entries = [(entry.stat().st_mtime, entry.path, self.get_size(entry.path))
+                       for entry in scan_sharded(self.root) if entry.is_dir()]
+            evict_lru(entries, self.max_bytes, lambda path: shutil.rmtree(path, ignore_errors=True))
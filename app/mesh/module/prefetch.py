@@ -0,0 +1,59 @@
+import threading
+
+
+class FramePrefetcher:
+    """
+    Background rendering of the frames next to the displayed one
+    """
+
+    def __init__(self, executor, window):
+
+        self.executor = executor
+
+        # Frames within +/- window of the displayed one are rendered
+        self.window = window
+
+        # Requests of older selections are skipped
+        self.futures = []
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get_neighbors(self, ifig, nframes):
+
+        # Nearest frames first
+        neighbors = []
+        for distance in range(1, self.window + 1):
+            for jfig in (ifig + distance, ifig - distance):
+                if 0 <= jfig < nframes:
+                    neighbors.append(jfig)
+
+        return neighbors
+
+    def schedule(self, render, ifig, nframes, *, ready=None):
+
+        # Frames not ingested yet are skipped (rendering them would block a thread until they are parsed)
+        neighbors = [jfig for jfig in self.get_neighbors(ifig, nframes) if ready is None or ready(jfig)]
+        with self.lock:
+            self.cancel_pending()
+            generation = self.generation
+            self.futures = [self.executor.submit(self.run, render, jfig, generation) for jfig in neighbors]
+
+    def run(self, render, ifig, generation):
+
+        # Selection changed after the request was queued
+        if generation != self.generation:
+            return
+
+        render(ifig)
+
+    def cancel_pending(self):
+
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+
+    def cancel(self):
+
+        with self.lock:
+            self.cancel_pending()
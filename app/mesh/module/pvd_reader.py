@@ -0,0 +1,35 @@
+import xml.etree.ElementTree as ET
+
+
+class PvdReader:
+    """
+    PVD (ParaView collection) file reader
+    """
+
+    def __init__(self):
+
+        # 各種タグ
+        self.dataset_tag = r'DataSet'
+        self.timestep_tag = r'timestep'
+        self.part_tag = r'part'
+        self.file_tag = r'file'
+
+        self.times = []
+        self.files = []
+
+    def read(self, file_path):
+
+        # Collection is small: parse the whole tree
+        root = ET.parse(file_path).getroot()
+        datasets = []
+        for elem in root.iter():
+            if elem.tag.split('}')[-1] != self.dataset_tag:
+                continue
+            # Time steps split into parts would show only a part of the mesh (one file per frame)
+            if int(elem.attrib.get(self.part_tag, 0)) != 0:
+                raise ValueError('Time steps split into parts are not supported (write them as PVTU files): {}'.format(elem.attrib[self.file_tag]))
+            datasets.append((float(elem.attrib.get(self.timestep_tag, len(datasets))), elem.attrib[self.file_tag]))
+
+        datasets.sort(key=lambda d: d[0])
+        self.times = [d[0] for d in datasets]
+        self.files = [d[1] for d in datasets]
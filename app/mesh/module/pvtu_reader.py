@@ -0,0 +1,167 @@
+import xml.etree.ElementTree as ET
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .vtu_reader import VtkReader
+from .connectivity import CellConnectivity
+
+
+def read_piece(file_path):
+
+    reader = VtkReader()
+    reader.read(file_path)
+    reader.read_all_fields()
+
+    return reader
+
+
+class PvtuReader(VtkReader):
+    """
+    Partitioned VTK (PVTU) file reader: pieces are merged into a single frame
+    """
+
+    def __init__(self, *, executor=None, max_workers=None, merge_points=False):
+
+        super().__init__()
+
+        self.source_tag = r'Source'
+
+        # Pieces are read in threads unless an executor is given
+        self.executor = executor
+        self.max_workers = max_workers
+
+        # Deduplicate nodes shared by neighboring pieces
+        self.merge_points = merge_points
+
+    def get_sources(self, file_path):
+
+        # Pieces are relative to the PVTU file
+        root = ET.parse(file_path).getroot()
+        directory = os.path.dirname(os.fspath(file_path))
+
+        sources = []
+        for elem in root.iter():
+            if elem.tag.split('}')[-1] == self.piece_tag and self.source_tag in elem.attrib:
+                sources.append(os.path.join(directory, elem.attrib[self.source_tag]))
+
+        return sources
+
+    def read(self, file_path, *, cache_dir=None, topology=None):
+
+        self.source = None
+        self.cache_dir = cache_dir
+        self.topology = topology
+        self.fields = {}
+
+        if self.cache_dir is not None and self.load_cache():
+            return
+
+        # Read pieces concurrently
+        sources = self.get_sources(file_path)
+        executor = self.executor if self.executor is not None else ThreadPoolExecutor(self.max_workers)
+        try:
+            pieces = list(executor.map(read_piece, sources))
+        finally:
+            if self.executor is None:
+                executor.shutdown()
+
+        self.merge(pieces)
+        if self.topology is not None and self.Lnodes is not None:
+            self.Lnodes = self.topology.intern(self.Lnodes)
+
+        # Merged frame has no source: all fields go to the cache
+        if self.cache_dir is not None:
+            self.save_cache()
+            for nodal, data_array in ((True, self.pts_data_array), (False, self.cell_data_array)):
+                for idat, dat in enumerate(data_array):
+                    field = self.fields[(dat.attrib[self.attrib_tag], nodal)]
+                    self.save_array(self.get_field_name(idat, nodal=nodal), field)
+
+    def parse_data_array(self, darray, *, dtype=float, component=None):
+
+        # Merged frame has no source: DataArrays are served from the merged (or cached) fields
+        field = None
+        for nodal, data_array in ((True, self.pts_data_array), (False, self.cell_data_array)):
+            for idat, dat in enumerate(data_array):
+                if dat is darray:
+                    field = self.fields.get((dat.attrib[self.attrib_tag], nodal))
+                    if field is None and self.cache_dir is not None:
+                        field = self.load_array(self.get_field_name(idat, nodal=nodal))
+        if field is None:
+            raise ValueError('DataArray is not stored: {}'.format(darray.attrib.get(self.attrib_tag)))
+
+        values = field[:, component] if component is not None else field.ravel()
+        if np.dtype(dtype).kind in 'SU':
+            # Tokens of integer values are written without a decimal point
+            return np.array([str(int(v)) if v.is_integer() else repr(v) for v in values.tolist()], dtype=dtype)
+        values = values.astype(dtype)
+
+        # Reshape by NumberOfComponents
+        if component is None and field.shape[1] > 1:
+            values = values.reshape(-1, field.shape[1])
+
+        return values
+
+    def merge(self, pieces):
+
+        # Header and DataArray index of the first piece
+        first = pieces[0]
+        for name in ['discretization_method', 'header_type', 'byte_order', 'compressor']:
+            setattr(self, name, getattr(first, name))
+        self.appended_encoding = None
+        self.appended_start = None
+        self.appended_end = None
+        self.appended_offsets = []
+        self.points_array = first.points_array
+        self.cells_array = first.cells_array
+        self.pts_data_array = first.pts_data_array
+        self.cell_data_array = first.cell_data_array
+
+        # Points
+        point_offsets = np.cumsum([0] + [p.npoints for p in pieces])
+        coords = np.concatenate([p.Coords for p in pieces], axis=1)
+        point_fields = {}
+        for dat in self.pts_data_array:
+            tag = dat.attrib[self.attrib_tag]
+            point_fields[tag] = np.concatenate([p.get_field(tag, nodal=True) for p in pieces])
+
+        # Cells (node indices are shifted by the points of preceding pieces)
+        if self.discretization_method == self.MESHFREE:
+            indices = None
+        else:
+            indices = np.concatenate([p.Lnodes.indices + point_offsets[i] for i, p in enumerate(pieces)])
+            index_offsets = np.cumsum([0] + [p.Lnodes.indices.size for p in pieces])
+            offsets = np.concatenate([p.Lnodes.offsets[1:] + index_offsets[i] for i, p in enumerate(pieces)])
+            if all(p.Lnodes.types is not None for p in pieces):
+                types = np.concatenate([p.Lnodes.types for p in pieces])
+            else:
+                types = None
+        for dat in self.cell_data_array:
+            tag = dat.attrib[self.attrib_tag]
+            self.fields[(tag, False)] = np.concatenate([p.get_field(tag, nodal=False) for p in pieces])
+
+        # Shared interface nodes have identical coordinates
+        if self.merge_points:
+            _, ifirst, inverse = np.unique(coords.T, axis=0, return_index=True, return_inverse=True)
+            # Keep nodes in order of first appearance
+            order = np.argsort(ifirst)
+            renumber = np.empty_like(order)
+            renumber[order] = np.arange(order.size)
+            ifirst = ifirst[order]
+            coords = coords[:, ifirst]
+            point_fields = {tag: field[ifirst] for tag, field in point_fields.items()}
+            if indices is not None:
+                indices = renumber[inverse.reshape(-1)][indices]
+
+        self.Coords = np.ascontiguousarray(coords)
+        for tag, field in point_fields.items():
+            self.fields[(tag, True)] = field
+        self.npoints = self.Coords.shape[1]
+        self.nelements = sum(p.nelements for p in pieces)
+        if indices is None:
+            self.Lnodes = None
+        else:
+            self.Lnodes = CellConnectivity.from_vtk(indices, offsets, types, ncells=self.nelements)
+        self.piece_attrib = {self.npts_tag: str(self.npoints), self.nelm_tag: str(self.nelements)}
@@ -0,0 +1,161 @@
+import numpy as np
+import matplotlib as mpl
+
+
+class MeshRasterizer:
+    """
+    Rasterizer of cell values into an RGBA image without matplotlib artists
+    """
+
+    # Colormap lookup tables shared by all rasterizers: (colormap, size) -> RGBA
+    luts = {}
+
+    def __init__(self, *, lut_size=256, chunk_size=1 << 20):
+
+        self.lut_size = lut_size
+
+        # Max # of candidate pixels tested at once
+        self.chunk_size = chunk_size
+
+    def get_lut(self, cmap):
+
+        lut = self.luts.get((cmap, self.lut_size))
+        if lut is None:
+            # Colors at the centers of the bins of the normalized value (read-only: shared by concurrent renders)
+            colors = mpl.cm.ScalarMappable(cmap=cmap).get_cmap()((np.arange(self.lut_size) + 0.5) / self.lut_size)
+            lut = np.round(colors * 255).astype('uint8')
+            lut.flags.writeable = False
+            lut = self.luts.setdefault((cmap, self.lut_size), lut)
+
+        return lut
+
+    def rasterize(self, coords, geometry, value, *, extent, shape):
+
+        xmin, xmax, ymin, ymax = extent
+        height, width = shape
+
+        # Node positions in pixels (row 0 at the top)
+        px = (coords[0, :] - xmin) * (width / (xmax - xmin))
+        py = (ymax - coords[1, :]) * (height / (ymax - ymin))
+
+        self.width = width
+        self.height = height
+        self.pixels = []
+        self.values = []
+
+        for (cells, _), corner_nodes in zip(geometry.groups, geometry.corner_nodes):
+            vals = np.asarray(value[cells], dtype=float)
+            drawn = np.isfinite(vals)
+            if not drawn.all():
+                corner_nodes = corner_nodes[:, drawn]
+                vals = vals[drawn]
+
+            # Corner-major layout: (# of corners, # of cells)
+            x = px[corner_nodes]
+            y = py[corner_nodes]
+
+            # Cells smaller than a pixel are aggregated at their centroids
+            small = (x.max(axis=0) - x.min(axis=0) < 1.) & (y.max(axis=0) - y.min(axis=0) < 1.)
+            if corner_nodes.shape[0] < 3 or small.all():
+                self.splat(x.mean(axis=0), y.mean(axis=0), vals)
+                continue
+            self.splat(x[:, small].mean(axis=0), y[:, small].mean(axis=0), vals[small])
+
+            # Larger cells are split into triangles (fan) and filled
+            large = ~small
+            x, y, vals = x[:, large], y[:, large], vals[large]
+            for icorner in range(1, corner_nodes.shape[0] - 1):
+                corners = [0, icorner, icorner + 1]
+                self.fill(x[corners], y[corners], vals)
+
+        # Mean of the values falling into each pixel
+        image = np.full(height * width, np.nan)
+        if len(self.pixels) > 0:
+            pixels = np.concatenate(self.pixels)
+            sums = np.bincount(pixels, weights=np.concatenate(self.values), minlength=height * width)
+            counts = np.bincount(pixels, minlength=height * width)
+            hit = counts > 0
+            image[hit] = sums[hit] / counts[hit]
+        self.pixels = []
+        self.values = []
+
+        return image.reshape(height, width)
+
+    def splat(self, x, y, vals):
+
+        inside = (x >= 0.) & (x < self.width) & (y >= 0.) & (y < self.height)
+        self.pixels.append(y[inside].astype('int64') * self.width + x[inside].astype('int64'))
+        self.values.append(vals[inside])
+
+    def fill(self, x, y, vals):
+
+        area = (x[1] - x[0]) * (y[2] - y[0]) - (x[2] - x[0]) * (y[1] - y[0])
+
+        # Pixels whose centers lie in the bounding box of each triangle
+        ix0 = np.maximum(np.ceil(x.min(axis=0) - 0.5), 0).astype('int64')
+        ix1 = np.minimum(np.floor(x.max(axis=0) - 0.5), self.width - 1).astype('int64')
+        iy0 = np.maximum(np.ceil(y.min(axis=0) - 0.5), 0).astype('int64')
+        iy1 = np.minimum(np.floor(y.max(axis=0) - 0.5), self.height - 1).astype('int64')
+        nx = ix1 - ix0 + 1
+        ny = iy1 - iy0 + 1
+
+        # Slivers between pixel centers are drawn at their centroids
+        hits = np.zeros(x.shape[1], dtype='int64')
+        candidates = np.flatnonzero((nx > 0) & (ny > 0) & (area != 0.))
+
+        # Triangles of similar size are tested together on a common grid
+        sx = 1 << np.ceil(np.log2(nx[candidates])).astype('int64')
+        sy = 1 << np.ceil(np.log2(ny[candidates])).astype('int64')
+        keys = sx * (int(sy.max(initial=0)) + 1) + sy
+        for key in np.unique(keys):
+            group = candidates[keys == key]
+            gx = int(sx[keys == key][0])
+            gy = int(sy[keys == key][0])
+            nchunk = max(self.chunk_size // (gx * gy), 1)
+            for istart in range(0, group.size, nchunk):
+                tris = group[istart:istart + nchunk]
+                hits[tris] = self.fill_group(x[:, tris], y[:, tris], vals[tris], area[tris],
+                                             ix0[tris], ix1[tris], iy0[tris], iy1[tris], gx, gy)
+
+        missed = hits == 0
+        self.splat(x[:, missed].mean(axis=0), y[:, missed].mean(axis=0), vals[missed])
+
+    def fill_group(self, x, y, vals, area, ix0, ix1, iy0, iy1, gx, gy):
+
+        # Candidate pixels: (triangle, row, column)
+        cx = ix0[:, None, None] + np.arange(gx)[None, None, :]
+        cy = iy0[:, None, None] + np.arange(gy)[None, :, None]
+        cx, cy = np.broadcast_arrays(cx, cy)
+        inside = (cx <= ix1[:, None, None]) & (cy <= iy1[:, None, None])
+
+        # Edge functions at pixel centers (sign of the area for either orientation)
+        sign = np.sign(area)[:, None, None]
+        pcx = cx + 0.5
+        pcy = cy + 0.5
+        for i0, i1 in ((0, 1), (1, 2), (2, 0)):
+            x0 = x[i0, :, None, None]
+            y0 = y[i0, :, None, None]
+            edge = (x[i1, :, None, None] - x0) * (pcy - y0) - (y[i1, :, None, None] - y0) * (pcx - x0)
+            inside &= edge * sign >= 0.
+
+        itri = np.broadcast_to(np.arange(x.shape[1])[:, None, None], inside.shape)[inside]
+        self.pixels.append(cy[inside] * self.width + cx[inside])
+        self.values.append(vals[itri])
+
+        return np.bincount(itri, minlength=x.shape[1])
+
+    def colorize(self, image, *, norm, cmap):
+
+        lut = self.get_lut(cmap)
+
+        # Empty pixels are transparent
+        hit = np.isfinite(image)
+        rgba = np.zeros(image.shape + (4,), dtype='uint8')
+        if norm.vmax > norm.vmin:
+            scale = self.lut_size / (norm.vmax - norm.vmin)
+        else:
+            scale = 0.
+        index = np.clip(((image[hit] - norm.vmin) * scale).astype('int64'), 0, self.lut_size - 1)
+        rgba[hit] = lut[index]
+
+        return rgba
@@ -0,0 +1,60 @@
+import io
+import queue
+import threading
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+class FigureRenderer:
+    """
+    Pool of reusable figures rendered to images without pyplot
+    """
+
+    def __init__(self, max_figures=4, *, width=6.4, min_height=2.4, max_height=9.6, dpi=100):
+
+        # Figures are reused (at most max_figures exist at once)
+        self.pool = queue.LifoQueue()
+        self.semaphore = threading.BoundedSemaphore(max_figures)
+
+        # Figure size in inches
+        self.width = width
+        self.min_height = min_height
+        self.max_height = max_height
+        self.dpi = dpi
+
+    def acquire(self):
+
+        self.semaphore.acquire()
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            fig = Figure(dpi=self.dpi)
+            FigureCanvasAgg(fig)
+            return fig
+
+    def release(self, fig):
+
+        fig.clf()
+        self.pool.put(fig)
+        self.semaphore.release()
+
+    def get_size(self, aspect):
+
+        # Height follows the aspect of the display area
+        if aspect is None:
+            return self.width, 0.75 * self.width
+
+        return self.width, min(max(self.width * aspect, self.min_height), self.max_height)
+
+    def render(self, draw, *, aspect=None, format='png'):
+
+        fig = self.acquire()
+        try:
+            fig.set_size_inches(*self.get_size(aspect))
+            draw(fig.add_subplot(1, 1, 1))
+            out_img = io.BytesIO()
+            fig.canvas.print_figure(out_img, format=format, dpi=self.dpi)
+            return out_img.getvalue()
+        finally:
+            self.release(fig)
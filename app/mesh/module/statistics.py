@@ -0,0 +1,225 @@
+import json
+import math
+import threading
+
+import numpy as np
+
+from .storage import atomic_write
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (log-spaced buckets, DDSketch)
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1. + relative_accuracy) / (1. - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        # Magnitudes below this are counted as zero
+        self.min_value = 1.e-300
+
+        # Bucket index -> count
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+
+        self.count = 0
+        self.vmin = math.inf
+        self.vmax = -math.inf
+
+    def add(self, values):
+
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+
+        self.count += values.size
+        self.vmin = min(self.vmin, float(values.min()))
+        self.vmax = max(self.vmax, float(values.max()))
+
+        for sign, buckets in ((1., self.positive), (-1., self.negative)):
+            magnitudes = sign * values
+            magnitudes = magnitudes[magnitudes > self.min_value]
+            if magnitudes.size == 0:
+                continue
+            keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype('int64'), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += int(np.count_nonzero(np.abs(values) <= self.min_value))
+
+    def merge(self, other):
+
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.vmin = min(self.vmin, other.vmin)
+        self.vmax = max(self.vmax, other.vmax)
+
+    def get_bucket_value(self, key):
+
+        return 2. * self.gamma ** key / (self.gamma + 1.)
+
+    def quantile(self, q):
+
+        if self.count == 0:
+            return None
+        if q <= 0.:
+            return self.vmin
+        if q >= 1.:
+            return self.vmax
+
+        # Walk buckets from the most negative value
+        rank = q * (self.count - 1)
+        total = 0
+        for key in sorted(self.negative, reverse=True):
+            total += self.negative[key]
+            if total > rank:
+                return max(-self.get_bucket_value(key), self.vmin)
+        total += self.zero_count
+        if total > rank:
+            return 0.
+        for key in sorted(self.positive):
+            total += self.positive[key]
+            if total > rank:
+                return min(self.get_bucket_value(key), self.vmax)
+
+        return self.vmax
+
+    def to_dict(self):
+
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'positive': {str(k): c for k, c in self.positive.items()},
+            'negative': {str(k): c for k, c in self.negative.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'min': self.vmin if self.count > 0 else None,
+            'max': self.vmax if self.count > 0 else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+
+        sketch = cls(data['relative_accuracy'])
+        sketch.positive = {int(k): c for k, c in data['positive'].items()}
+        sketch.negative = {int(k): c for k, c in data['negative'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        if sketch.count > 0:
+            sketch.vmin = data['min']
+            sketch.vmax = data['max']
+
+        return sketch
+
+
+def compute_frame_statistics(reader):
+
+    # Bounding box of the frame
+    coords = reader.Coords
+    stats = {
+        'bounds': [float(np.min(coords[0, :])), float(np.max(coords[0, :])),
+                   float(np.min(coords[1, :])), float(np.max(coords[1, :]))],
+        'fields': {},
+    }
+
+    # Distribution of each system of each field
+    nodal = reader.is_nodal_mesh()
+    for tag in reader.get_data_dict():
+        if tag == 'Mesh':
+            continue
+        field = reader.get_field(tag, nodal=nodal)
+        systems = []
+        for isys in range(field.shape[1]):
+            sketch = QuantileSketch()
+            sketch.add(field[:, isys])
+            systems.append(sketch.to_dict())
+        stats['fields'][tag] = systems
+
+    return stats
+
+
+class DatasetStatistics:
+    """
+    Bounds and value distributions accumulated over the frames of a dataset
+    """
+
+    def __init__(self):
+
+        # Frame index -> frame statistics (and frame indices in order of addition)
+        self.frames = {}
+        self.order = []
+
+        # Merged sketches: (tag, system) -> (# of frames merged in order of addition, sketch)
+        self.sketches = {}
+
+        self.lock = threading.Lock()
+
+    def add_frame(self, ifig, stats):
+
+        with self.lock:
+            if ifig not in self.frames:
+                self.order.append(ifig)
+            elif self.frames[ifig] != stats:
+                # Frame parsed again with other contents: merged sketches are rebuilt
+                self.sketches = {}
+            self.frames[ifig] = stats
+
+    def get_bounds(self):
+
+        with self.lock:
+            bounds = [s['bounds'] for s in self.frames.values()]
+
+        if len(bounds) == 0:
+            return None
+
+        bounds = np.array(bounds)
+        return [float(bounds[:, 0].min()), float(bounds[:, 1].max()), float(bounds[:, 2].min()), float(bounds[:, 3].max())]
+
+    def get_sketch(self, tag, system):
+
+        with self.lock:
+            nmerged, sketch = self.sketches.get((tag, system), (0, None))
+            if sketch is None:
+                sketch = QuantileSketch()
+
+            # Only frames added since the last call are merged (frames keep arriving in tail mode)
+            for ifig in self.order[nmerged:]:
+                systems = self.frames[ifig]['fields'].get(tag)
+                if systems is not None and system - 1 < len(systems):
+                    sketch.merge(QuantileSketch.from_dict(systems[system - 1]))
+            self.sketches[(tag, system)] = (len(self.order), sketch)
+
+        return sketch
+
+    def get_range(self, tag, system, *, percentiles=None):
+
+        sketch = self.get_sketch(tag, system)
+        if sketch.count == 0:
+            return None
+
+        if percentiles is None:
+            return sketch.vmin, sketch.vmax
+
+        return sketch.quantile(percentiles[0] / 100.), sketch.quantile(percentiles[1] / 100.)
+
+    def save(self, path):
+
+        with self.lock:
+            frames = {str(ifig): stats for ifig, stats in self.frames.items()}
+        with atomic_write(path, 'w') as f:
+            json.dump(frames, f)
+
+    def load(self, path):
+
+        with open(path) as f:
+            frames = json.load(f)
+        with self.lock:
+            self.frames = {int(ifig): stats for ifig, stats in frames.items()}
+            self.order = list(self.frames)
+            self.sketches = {}
@@ -0,0 +1,45 @@
+import contextlib
+import os
+import threading
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb'):
+
+    # Readers see the previous file or the complete new one (temporary name unique to the process and thread)
+    tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def scan_sharded(root):
+
+    # Entries of a directory sharded by the first characters of their keys (root/ab/abcdef...)
+    if not os.path.isdir(root):
+        return
+    for prefix in os.scandir(root):
+        if prefix.is_dir():
+            yield from os.scandir(prefix.path)
+
+
+def evict_lru(entries, max_bytes, remove, *, keep=0):
+
+    # entries: (last access, key, size); least recently used entries are removed until the total fits
+    # (the keep most recently used ones are never removed)
+    entries = sorted(entries)
+    total = sum(e[2] for e in entries)
+    removed = []
+    for _, key, size in entries[:len(entries) - keep]:
+        if total <= max_bytes:
+            break
+        remove(key)
+        removed.append(key)
+        total -= size
+
+    return removed
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import weakref
+
+import numpy as np
+
+from .connectivity import CellConnectivity
+from .npy_cache import NpyCache
+from .storage import atomic_write
+
+
+class TopologyStore(NpyCache):
+    """
+    Connectivities stored once per topology hash and shared by frames
+    """
+
+    def __init__(self, root, max_bytes=None):
+
+        super().__init__(root, max_bytes)
+
+        # Connectivities in use: hash -> connectivity
+        self.topologies = weakref.WeakValueDictionary()
+        self.topology_lock = threading.Lock()
+
+    def intern(self, connectivity):
+
+        # Frames with the same topology get the same object
+        key = connectivity.get_hash()
+        with self.topology_lock:
+            shared = self.topologies.get(key)
+            if shared is None:
+                self.topologies[key] = connectivity
+                shared = connectivity
+
+        return shared
+
+    def save(self, connectivity):
+
+        key = connectivity.get_hash()
+        path = self.frame_dir(key)
+        if os.path.exists(os.path.join(path, 'index.json')):
+            return key
+
+        arrays = {'indices': connectivity.indices, 'offsets': connectivity.offsets, 'types': connectivity.types}
+        for name, array in arrays.items():
+            if array is None:
+                continue
+            with atomic_write(os.path.join(path, name + '.npy')) as f:
+                np.save(f, array)
+
+        # Index is written last: its presence marks a complete entry
+        with atomic_write(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({'ncells': connectivity.ncells}, f)
+
+        return key
+
+    def load(self, key):
+
+        with self.topology_lock:
+            connectivity = self.topologies.get(key)
+        if connectivity is not None:
+            return connectivity
+
+        path = os.path.join(self.root, key[:2], key)
+        if not os.path.exists(os.path.join(path, 'index.json')):
+            return None
+        path = self.frame_dir(key)
+
+        arrays = []
+        for name in ['indices', 'offsets', 'types']:
+            array_path = os.path.join(path, name + '.npy')
+            arrays.append(np.load(array_path, mmap_mode='r') if os.path.exists(array_path) else None)
+        connectivity = CellConnectivity(*arrays)
+        connectivity.hash = key
+
+        return self.intern(connectivity)
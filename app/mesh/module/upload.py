@@ -0,0 +1,58 @@
+import fcntl
+import os
+import re
+
+
+def parse_content_range(header):
+
+    # 'bytes start-end/total' -> (start, end, total)
+    match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', header.strip())
+    if match is None:
+        raise ValueError('Invalid Content-Range: {}'.format(header))
+
+    return tuple(int(v) for v in match.groups())
+
+
+def get_offset(path):
+
+    # # of bytes received (the whole file once it is complete)
+    for p in (path, path + '.part'):
+        try:
+            return os.path.getsize(p)
+        except FileNotFoundError:
+            pass
+
+    return 0
+
+
+def write_chunk(path, stream, start, total, *, buffer_size=1 << 20):
+
+    # Chunks are appended to a partial file which is renamed when all bytes are received
+    part_path = path + '.part'
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+b') as f:
+        # Retries of the same chunk may arrive at another worker
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            return total, False
+
+        # Chunk not following the received bytes: the client resumes from the returned offset
+        offset = os.fstat(f.fileno()).st_size
+        if start != offset:
+            return offset, False
+
+        # Request body is copied in small pieces (memory does not grow with the chunk size)
+        f.seek(offset)
+        for data in iter(lambda: stream.read(buffer_size), b''):
+            offset += len(data)
+            if offset > total:
+                f.truncate(start)
+                raise ValueError('Chunk exceeds the file size')
+            f.write(data)
+        f.flush()
+
+        if offset < total:
+            return offset, False
+        os.replace(part_path, path)
+
+    return offset, True
@@ -1,10 +1,33 @@
-import xml.etree.ElementTree as ET
+import xml.parsers.expat
+import contextlib
+import json
 import os
 import sys
 import glob
 import shutil
+import base64
+import zlib
 import numpy as np
 
+from .connectivity import CellConnectivity
+from .storage import atomic_write
+
+
+class DataArrayEntry:
+    """
+    Index entry of a DataArray (attributes and byte range in the file)
+    """
+
+    def __init__(self, attrib, start):
+
+        self.attrib = attrib
+        self.start = start
+        self.end = start
+
+
+class AppendedDataFound(Exception):
+    pass
+
 
 class VtkReader:
     """
@@ -14,97 +37,387 @@ class VtkReader:
     def __init__(self):
 
         # 各種タグ
-        self.root_tag = r'{VTK}UnstructuredGrid'
-        self.piece_tag = r'{VTK}Piece'
+        self.vtk_file_tag = r'VTKFile'
+        self.piece_tag = r'Piece'
         self.attrib_tag = r'Name'
         self.ncomp_tag = r'NumberOfComponents'
         self.nelm_tag = r'NumberOfCells'
         self.npts_tag = r'NumberOfPoints'
-        self.pts_data_tag = r'{VTK}PointData'
-        self.cell_data_tag = r'{VTK}CellData'
-        self.points_tag = r'{VTK}Points'
-        self.cells_tag = r'{VTK}Cells'
-        self.darray_tag = r'{VTK}DataArray'
+        self.pts_data_tag = r'PointData'
+        self.cell_data_tag = r'CellData'
+        self.points_tag = r'Points'
+        self.cells_tag = r'Cells'
+        self.darray_tag = r'DataArray'
+        self.appended_tag = r'AppendedData'
+        self.format_tag = r'format'
+        self.type_tag = r'type'
+        self.offset_tag = r'offset'
 
         self.MESHFREE = r'Meshfree'
         self.FEM = r'FiniteElement'
 
         self.tag_orientation = r'Crystal Orientation'
 
-    def read(self, file_path):
+        # VTK data types
+        self.vtk_types = {
+            'Int8': 'i1', 'UInt8': 'u1',
+            'Int16': 'i2', 'UInt16': 'u2',
+            'Int32': 'i4', 'UInt32': 'u4',
+            'Int64': 'i8', 'UInt64': 'u8',
+            'Float32': 'f4', 'Float64': 'f8',
+        }
 
-        # Parse XML
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        try:
-            self.discretization_method = root.attrib['name']
-        except Exception:
-            try:
-                self.discretization_method = root.attrib[self.attrib_tag]
-            except Exception:
-                self.discretization_method = self.FEM
-        unstructured_grid = root.find(self.root_tag)
-        piece = unstructured_grid.find(self.piece_tag)
+        # Size of chunks fed to the XML parser
+        self.chunk_size = 1 << 20
+
+        # State stored in the on-disk cache
+        self.cache_version = 3
+        self.cache_attributes = [
+            'discretization_method', 'header_type', 'byte_order', 'compressor',
+            'appended_encoding', 'appended_start', 'appended_end', 'appended_offsets',
+            'piece_attrib', 'nelements', 'npoints',
+        ]
+        self.cache_data_arrays = ['points_array', 'cells_array', 'pts_data_array', 'cell_data_array']
+
+    def read(self, file_path, *, cache_dir=None, topology=None):
+
+        self.source = file_path
+        self.cache_dir = cache_dir
+
+        # Connectivities shared with other frames (TopologyStore)
+        self.topology = topology
+
+        # Parsed fields of this frame: (tag, nodal) -> (nvalue, nsystem) matrix
+        self.fields = {}
+
+        # Arrays parsed from the same contents are memory-mapped
+        if self.cache_dir is not None and self.load_cache():
+            return
+
+        # Index DataArrays (no array is loaded at this point)
+        self.index_data_arrays()
 
         # \# of nodes, elements and coordinates
-        self.nelements = int(piece.attrib[self.nelm_tag])
-        self.npoints = int(piece.attrib[self.npts_tag])
-        self.Coords = self.read_coordinates(piece)
+        self.nelements = int(self.piece_attrib[self.nelm_tag])
+        self.npoints = int(self.piece_attrib[self.npts_tag])
+        self.Coords = self.read_coordinates()
+        if self.discretization_method == self.MESHFREE:
+            self.Lnodes = None
+        else:
+            self.Lnodes = self.read_connectivity()
+            if self.topology is not None:
+                self.Lnodes = self.topology.intern(self.Lnodes)
+
+        if self.cache_dir is not None:
+            self.save_cache()
+
+    def save_cache(self):
+
+        self.save_array('coords', self.Coords)
+        topology = None
+        if self.Lnodes is not None and self.topology is not None:
+            # Connectivity is stored once for all frames with the same topology
+            topology = self.topology.save(self.Lnodes)
+        elif self.Lnodes is not None:
+            self.save_array('cell_indices', self.Lnodes.indices)
+            self.save_array('cell_offsets', self.Lnodes.offsets)
+            if self.Lnodes.types is not None:
+                self.save_array('cell_types', self.Lnodes.types)
+
+        # Index is written last: its presence marks a complete entry
+        index = {name: getattr(self, name) for name in self.cache_attributes}
+        index['version'] = self.cache_version
+        index['topology'] = topology
+        for name in self.cache_data_arrays:
+            index[name] = [[d.attrib, d.start, d.end] for d in getattr(self, name)]
+        with atomic_write(os.path.join(self.cache_dir, 'index.json'), 'w') as f:
+            json.dump(index, f)
+
+    def load_cache(self):
+
+        path = os.path.join(self.cache_dir, 'index.json')
+        if not os.path.exists(path):
+            return False
+
+        with open(path) as f:
+            index = json.load(f)
+        if index.get('version') != self.cache_version:
+            return False
+        for name in self.cache_attributes:
+            setattr(self, name, index[name])
+        for name in self.cache_data_arrays:
+            entries = []
+            for attrib, start, end in index[name]:
+                entry = DataArrayEntry(attrib, start)
+                entry.end = end
+                entries.append(entry)
+            setattr(self, name, entries)
+
+        self.Coords = self.load_array('coords')
         if self.discretization_method == self.MESHFREE:
             self.Lnodes = None
+        elif index['topology'] is not None:
+            # Shared connectivity (parsed again if it is no longer stored)
+            if self.topology is None:
+                return False
+            self.Lnodes = self.topology.load(index['topology'])
+            if self.Lnodes is None:
+                return False
         else:
-            self.Lnodes = self.read_connectivity(piece)
+            self.Lnodes = CellConnectivity(
+                self.load_array('cell_indices'), self.load_array('cell_offsets'), self.load_array('cell_types')
+            )
+
+        return True
+
+    def save_array(self, name, array):
+
+        # Frames evicted from the cache may be parsed again by several threads at once
+        with atomic_write(os.path.join(self.cache_dir, name + '.npy')) as f:
+            np.save(f, array)
+
+    def load_array(self, name):
+
+        path = os.path.join(self.cache_dir, name + '.npy')
+        if not os.path.exists(path):
+            return None
+
+        return np.load(path, mmap_mode='r')
+
+    def index_data_arrays(self):
+
+        self.piece_attrib = None
+        self.points_array = []
+        self.cells_array = []
+        self.pts_data_array = []
+        self.cell_data_array = []
+        self.appended_encoding = None
+        self.appended_start = None
+        self.appended_end = None
+
+        sections = {
+            self.points_tag: self.points_array,
+            self.cells_tag: self.cells_array,
+            self.pts_data_tag: self.pts_data_array,
+            self.cell_data_tag: self.cell_data_array,
+        }
+        stack = []
+        root_attrib = {}
+        npieces = 0
+
+        parser = xml.parsers.expat.ParserCreate()
+
+        def start_element(name, attrib):
+            nonlocal npieces
+            if name == self.vtk_file_tag:
+                root_attrib.update(attrib)
+            elif name == self.piece_tag:
+                npieces += 1
+                if npieces == 1:
+                    self.piece_attrib = attrib
+            elif name == self.darray_tag and npieces == 1 and stack[-1] in sections:
+                sections[stack[-1]].append(DataArrayEntry(attrib, parser.CurrentByteIndex))
+            elif name == self.appended_tag:
+                self.appended_encoding = attrib.get('encoding', 'base64')
+                self.appended_start = parser.CurrentByteIndex
+                if self.appended_encoding == 'raw':
+                    # Raw binary is not valid XML: stop here
+                    raise AppendedDataFound()
+            stack.append(name)
+
+        def end_element(name):
+            stack.pop()
+            if name == self.darray_tag and npieces == 1 and stack[-1] in sections:
+                sections[stack[-1]][-1].end = parser.CurrentByteIndex
+            elif name == self.appended_tag:
+                self.appended_end = parser.CurrentByteIndex
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+
+        # Stream the file through the parser
+        with self.open_source() as f:
+            try:
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    parser.Parse(chunk, len(chunk) == 0)
+                    if len(chunk) == 0:
+                        break
+            except AppendedDataFound:
+                pass
 
-        try:
-            point_data = piece.find(self.pts_data_tag)
-            self.pts_data_array = point_data.findall(self.darray_tag)
-        except Exception:
-            self.pts_data_array = None
+            # Appended data starts after the '_' marker
+            if self.appended_start is not None:
+                f.seek(self.appended_start)
+                head = f.read(self.chunk_size)
+                self.appended_start += head.index(b'_', head.index(b'>')) + 1
 
         try:
-            cell_data = piece.find(self.cell_data_tag)
-            self.cell_data_array = cell_data.findall(self.darray_tag)
+            self.discretization_method = root_attrib['name']
         except Exception:
-            self.cell_data_array = None
+            try:
+                self.discretization_method = root_attrib[self.attrib_tag]
+            except Exception:
+                self.discretization_method = self.FEM
+        self.header_type = root_attrib.get('header_type', 'UInt32')
+        self.byte_order = '>' if root_attrib.get('byte_order') == 'BigEndian' else '<'
+        self.compressor = root_attrib.get('compressor')
+
+        # Offsets of appended arrays (used to delimit base64 blocks)
+        self.appended_offsets = sorted(
+            int(d.attrib[self.offset_tag])
+            for d in self.points_array + self.cells_array + self.pts_data_array + self.cell_data_array
+            if d.attrib.get(self.format_tag) == 'appended'
+        )
+
+    def open_source(self):
+
+        if isinstance(self.source, (str, os.PathLike)):
+            return open(self.source, 'rb')
+
+        # File-like object: rewind and keep it open
+        self.source.seek(0)
+        return contextlib.nullcontext(self.source)
+
+    def read_bytes(self, start, stop):
+
+        with self.open_source() as f:
+            f.seek(start)
+            return f.read(stop - start)
+
+    def parse_data_array(self, darray, *, dtype=float, component=None):
 
-    def read_coordinates(self, piece):
+        ncomp = int(darray.attrib.get(self.ncomp_tag, 1))
+        data_format = darray.attrib.get(self.format_tag, 'ascii')
 
-        points = piece.find(self.points_tag)
-        cods = points.find(self.darray_tag)
+        if data_format == 'ascii' or data_format == 'binary':
+            # Inline data: text after the start tag
+            contents = self.read_bytes(darray.start, darray.end)
+            text = contents[contents.rfind(b'>') + 1:]
 
-        coords_list = cods.text.split('\n')
-        coords = np.zeros((3, self.npoints), dtype=float)
-        ipnt = 0
-        for cod_lst in coords_list:
-            if cod_lst == '':
-                continue
-            cod = cod_lst.split(' ')
-            for idof in range(3):
-                coords[idof, ipnt] = float(cod[idof])
-            ipnt += 1
+        if data_format == 'ascii':
+            # Strings (IDs) are kept as tokens
+            if component is not None and np.dtype(dtype).kind in 'SU':
+                tokens = text.decode('ascii').split()
+                return np.array(tokens[component::ncomp], dtype=dtype)
+
+            # Bulk parse of ASCII DataArray (numbers are never split into Python strings)
+            values = np.fromstring(text.decode('ascii'), dtype=dtype, sep=' ')
+            if component is not None:
+                return np.ascontiguousarray(values[component::ncomp])
+        else:
+            vtype = np.dtype(self.vtk_types[darray.attrib[self.type_tag]]).newbyteorder(self.byte_order)
+            if data_format == 'binary':
+                values = self.decode_base64(text.strip(), vtype)
+            elif self.appended_encoding == 'raw':
+                values = self.decode_raw(int(darray.attrib[self.offset_tag]), vtype)
+            else:
+                offset = int(darray.attrib[self.offset_tag])
+                inext = np.searchsorted(self.appended_offsets, offset, side='right')
+                if inext < len(self.appended_offsets):
+                    end = self.appended_start + self.appended_offsets[inext]
+                else:
+                    end = self.appended_end
+                text = self.read_bytes(self.appended_start + offset, end)
+                values = self.decode_base64(text.strip(), vtype)
+            values = values.astype(dtype, copy=False)
+            if component is not None:
+                return np.ascontiguousarray(values[component::ncomp])
+
+        # Reshape by NumberOfComponents
+        if ncomp > 1:
+            values = values.reshape(-1, ncomp)
+
+        return values
+
+    def decode_base64(self, text, vtype):
+
+        header_type = np.dtype(self.vtk_types[self.header_type]).newbyteorder(self.byte_order)
+        hsize = header_type.itemsize
+
+        if self.compressor is None:
+            # Header: [nbytes] (encoded together with or separately from the data)
+            nchar = 4 * -(-hsize // 3)
+            nbytes = int(np.frombuffer(base64.b64decode(text[:nchar])[:hsize], header_type)[0])
+            if text[nchar - 1:nchar] == b'=':
+                data = base64.b64decode(text[nchar:])
+            else:
+                data = base64.b64decode(text)[hsize:hsize + nbytes]
+        else:
+            # Header: [nblocks, block size, last block size, compressed sizes...]
+            nchar = 4 * -(-3 * hsize // 3)
+            nblocks = int(np.frombuffer(base64.b64decode(text[:nchar])[:hsize], header_type)[0])
+            nchar = 4 * -(-(3 + nblocks) * hsize // 3)
+            header = np.frombuffer(base64.b64decode(text[:nchar])[:(3 + nblocks) * hsize], header_type)
+            data = self.decompress(base64.b64decode(text[nchar:]), header[3:])
+
+        return np.frombuffer(data, vtype)
+
+    def decode_raw(self, offset, vtype):
+
+        header_type = np.dtype(self.vtk_types[self.header_type]).newbyteorder(self.byte_order)
+        hsize = header_type.itemsize
+        start = self.appended_start + offset
+
+        with self.open_source() as f:
+            f.seek(start)
+            if self.compressor is None:
+                nbytes = int(np.frombuffer(f.read(hsize), header_type)[0])
+                data = f.read(nbytes)
+            else:
+                nblocks = int(np.frombuffer(f.read(hsize), header_type)[0])
+                header = np.frombuffer(f.read((2 + nblocks) * hsize), header_type)
+                data = self.decompress(f.read(int(np.sum(header[2:]))), header[2:])
+
+        return np.frombuffer(data, vtype)
+
+    def decompress(self, data, block_sizes):
+
+        if self.compressor != 'vtkZLibDataCompressor':
+            print('[ERROR] Unsupported compressor: {}'.format(self.compressor))
+            sys.exit(1)
+
+        blocks = []
+        istart = 0
+        for size in block_sizes:
+            blocks.append(zlib.decompress(data[istart:istart + int(size)]))
+            istart += int(size)
+
+        return b''.join(blocks)
+
+    def read_coordinates(self):
+
+        cods = self.points_array[0]
+
+        coords = self.parse_data_array(cods, dtype=float).reshape(self.npoints, -1)
+        coords = np.ascontiguousarray(coords[:, :3].T)
 
         return coords
 
-    def read_connectivity(self, piece):
-        cells = piece.find(self.cells_tag)
-        darray = cells.findall(self.darray_tag)
-        lnodes = []
-        for d in darray:
-            if d.attrib[self.attrib_tag] == 'connectivity':
-                lnodes_list = d.text.split('\n')
-                for lnd_lst in lnodes_list:
-                    if lnd_lst == '':
-                        continue
-                    lnd = lnd_lst.split(' ')
-                    nod_lst = []
-                    for nod in lnd:
-                        if nod != '':
-                            nod_lst.append(int(nod))
-                    lnodes.append(nod_lst)
-
-        lnodes = np.array(lnodes)
-
-        return lnodes
+    def read_connectivity(self):
+
+        # connectivity/offsets/types arrays -> CSR
+        arrays = {}
+        for d in self.cells_array:
+            name = d.attrib[self.attrib_tag]
+            if name == 'connectivity' or name == 'offsets':
+                arrays[name] = self.parse_data_array(d, dtype='int64')
+            elif name == 'types':
+                arrays[name] = self.parse_data_array(d, dtype='uint8')
+
+        return CellConnectivity.from_vtk(
+            arrays.get('connectivity', np.zeros(0, dtype='int64')), arrays.get('offsets'), arrays.get('types'),
+            ncells=self.nelements
+        )
+
+    def nbytes(self):
+
+        # Memory held by parsed arrays (the source, memory-mapped files and shared connectivities are not counted)
+        arrays = [self.Coords] + list(self.fields.values())
+        if self.Lnodes is not None and self.topology is None:
+            arrays += self.Lnodes.arrays()
+
+        return sum(a.nbytes for a in arrays if a is not None and not isinstance(a, np.memmap))
 
     def is_nodal_mesh(self):
 
@@ -126,7 +439,16 @@ class VtkReader:
 
         return data_dict
 
-    def get_value(self, tag, *, system, nodal=False):
+    def get_field_name(self, idat, *, nodal=False):
+
+        # File name of a field in the on-disk cache
+        return '{}_{}'.format('point' if nodal else 'cell', idat)
+
+    def get_field(self, tag, *, nodal=False):
+
+        key = (tag, nodal)
+        if key in self.fields:
+            return self.fields[key]
 
         if nodal:
             data_array = self.pts_data_array
@@ -135,39 +457,45 @@ class VtkReader:
             data_array = self.cell_data_array
             nvalue = self.nelements
 
-        isFound = False
-        val = np.zeros(nvalue, dtype=float)
-        for dat in data_array:
+        field = None
+        for idat, dat in enumerate(data_array):
             if tag == dat.attrib[self.attrib_tag]:
-                val_list = dat.text.split('\n')
-                ival = 0
-                for vlst in val_list:
-                    if vlst == '':
-                        continue
-                    vl = vlst.split()
-                    if system == -1:
-                        val = val.astype('int64')
-                        for v in vl:
-                            if v == '':
-                                continue
-                            val[ival] = int(v)
-                            isFound = True
-                            ival += 1
-                    else:
-                        isys = 0
-                        for v in vl:
-                            if v == '':
-                                continue
-                            if isys == system - 1:
-                                val[ival] = float(v)
-                                isFound = True
-                            isys += 1
-                        ival += 1
-        if not isFound:
+                name = self.get_field_name(idat, nodal=nodal)
+                if self.cache_dir is not None:
+                    field = self.load_array(name)
+                if field is None:
+                    field = self.parse_data_array(dat, dtype=float).reshape(nvalue, -1)
+                    if self.cache_dir is not None:
+                        self.save_array(name, field)
+                self.fields[key] = field
+                break
+
+        return field
+
+    def read_all_fields(self):
+
+        for dat in self.pts_data_array:
+            self.get_field(dat.attrib[self.attrib_tag], nodal=True)
+        for dat in self.cell_data_array:
+            self.get_field(dat.attrib[self.attrib_tag], nodal=False)
+
+    def get_value(self, tag, *, system, nodal=False):
+
+        if system == -1:
+            data_array = self.pts_data_array if nodal else self.cell_data_array
+            for dat in data_array:
+                if tag == dat.attrib[self.attrib_tag]:
+                    return self.parse_data_array(dat, dtype='int64').ravel()
+            field = None
+        else:
+            field = self.get_field(tag, nodal=nodal)
+
+        if field is None or not 0 < system <= field.shape[1]:
             print('[ERROR] Cannot find value: {} (System: {})'.format(tag, system))
             sys.exit(1)
 
-        return val
+        # Column view (no copy)
+        return field[:, system - 1]
 
     def get_basis(self, tag, *, nodal=True):
 
@@ -184,23 +512,10 @@ class VtkReader:
         isFound = False
         for dat in data_array:
             if tag == dat.attrib[self.attrib_tag]:
-                val_list = dat.text.split('\n')
-                basis = []
-                for vlst in val_list:
-                    if vlst == '':
-                        continue
-                    vl = vlst.split()
-                    if len(basis) == 0:
-                        nsystem = int(len(vl) / 3)
-                    val = np.zeros((nsystem, 3), dtype='float')
-                    icnt = 0
-                    for v in vl:
-                        if v == '':
-                            continue
-                        val[icnt // 3, icnt % 3] = float(v)
-                        isFound = True
-                        icnt += 1
-                    basis.append(val)
+                values = self.parse_data_array(dat, dtype=float).reshape(nvalue, -1, 3)
+                nsystem = values.shape[1]
+                basis = list(values)
+                isFound = values.size > 0
         if not isFound:
             print('[ERROR] Cannot find value: {}'.format(tag))
             sys.exit(1)
@@ -223,18 +538,8 @@ class VtkReader:
         isFound = False
         for dat in data_array:
             if tag == dat.attrib[self.attrib_tag]:
-                val_list = dat.text.split('\n')
-                ids = []
-                for vlst in val_list:
-                    if vlst == '':
-                        continue
-                    vl = vlst.split()
-                    for v in vl:
-                        if v == '':
-                            continue
-                        ids.append(v)
-                        isFound = True
-                        break
+                ids = self.parse_data_array(dat, dtype=str, component=0).tolist()
+                isFound = len(ids) > 0
         if not isFound:
             print('[ERROR] Cannot find value: {}'.format(tag))
             sys.exit(1)
@@ -258,24 +563,11 @@ class VtkReader:
         for dat in data_array:
             if self.tag_orientation == dat.attrib[self.attrib_tag]:
                 isFound = True
-                val_list = dat.text.split('\n')
-                orientations = []
-                for vlst in val_list:
-                    if vlst == '':
-                        continue
-                    vl = vlst.split()
-                    orie = []
-                    for v in vl:
-                        if v == '':
-                            continue
-                        orie.append(v)
-                    orientations.append(orie)
+                orientations = self.parse_data_array(dat, dtype=float).reshape(nvalue, -1)
         if not isFound:
             print('[ERROR] Cannot find value: {}'.format(self.tag_orientation))
             sys.exit(1)
 
-        orientations = np.array(orientations, dtype='float')
-
         if orientations.shape[0] != nvalue and orientations.shape[1] != 3:
             print('[ERROR] Cannot set crystal orientation properly: size {}x{}'.format(orientations.shape[0], orientations.shape[1]))
             sys.exit(1)
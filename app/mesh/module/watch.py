@@ -0,0 +1,56 @@
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+
+from .pvd_reader import PvdReader
+
+
+FRAME_SUFFIXES = ('.vtu', '.pvtu', '.pvd')
+
+
+def resolve_watch_dir(directory, roots):
+
+    # Only directories under the allowed roots can be followed
+    path = os.path.realpath(directory)
+    for root in roots:
+        root = os.path.realpath(root)
+        if os.path.commonpath([path, root]) == root and os.path.isdir(path):
+            return path
+
+    raise ValueError('Directory is not allowed: {}'.format(directory))
+
+
+def get_frame_number(name):
+
+    match = re.search(r'\d+', name)
+
+    return (int(match.group()) if match is not None else -1, name)
+
+
+def scan_frames(directory, *, settle=2.):
+
+    # Files modified within settle seconds are still being written (left for the next scan)
+    now = time.time()
+    files = {}
+    for entry in os.scandir(directory):
+        if entry.is_file(follow_symlinks=False) and entry.name.lower().endswith(FRAME_SUFFIXES):
+            if now - entry.stat().st_mtime >= settle:
+                files[entry.name] = entry.path
+
+    # Frame order: PVD collection if any, otherwise number in file names
+    pvd_names = sorted(name for name in files if name.lower().endswith('.pvd'))
+    if len(pvd_names) > 0:
+        pvd = PvdReader()
+        try:
+            pvd.read(files[pvd_names[0]])
+        except ET.ParseError:
+            return [], []
+        frames = [(t, os.path.basename(f)) for t, f in zip(pvd.times, pvd.files) if os.path.basename(f) in files]
+        return [f for _, f in frames], [t for t, _ in frames]
+
+    # Pieces of partitioned files are not frames
+    pvtu_names = [name for name in files if name.lower().endswith('.pvtu')]
+    names = pvtu_names or [name for name in files if name.lower().endswith('.vtu')]
+
+    return sorted(names, key=get_frame_number), None
@@ -0,0 +1,70 @@
+import base64
+import hashlib
+
+import numpy as np
+
+
+# Quantized values: 0 .. VALUE_MAX (NaN is VALUE_NAN)
+VALUE_MAX = 65534
+VALUE_NAN = 65535
+
+
+def encode_array(array, dtype):
+
+    # Little-endian binary as base64 (decoded into typed arrays in the browser)
+    array = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder('<'))
+
+    return base64.b64encode(array.data).decode('ascii')
+
+
+def get_geometry_payload(key, geometry):
+
+    # Triangles are sent once per topology (none for point clouds)
+    if geometry is None:
+        triangles, triangle_cells = np.zeros((0, 3)), np.zeros(0)
+    else:
+        triangles, triangle_cells = geometry.get_triangles()
+
+    return {
+        'topology': key,
+        'ntriangles': int(triangles.shape[0]),
+        'triangles': encode_array(triangles, 'int32'),
+        'cells': encode_array(triangle_cells, 'int32'),
+    }
+
+
+def get_points_key(coords):
+
+    return hashlib.sha1(np.ascontiguousarray(coords[:2, :]).data).hexdigest()
+
+
+def get_points_payload(key, coords):
+
+    # Node positions are sent only when they change
+    return {
+        'key': key,
+        'x': encode_array(coords[0, :], 'float32'),
+        'y': encode_array(coords[1, :], 'float32'),
+    }
+
+
+def get_values_payload(value, vrange):
+
+    value = np.asarray(value, dtype=float)
+    if vrange is None:
+        vrange = (np.nanmin(value), np.nanmax(value))
+    vmin, vmax = float(vrange[0]), float(vrange[1])
+
+    # 16-bit steps are finer than the colormap (values outside the range are clipped)
+    scale = VALUE_MAX / (vmax - vmin) if vmax > vmin else 0.
+    quantized = np.full(value.shape, VALUE_NAN, dtype='uint16')
+    finite = np.isfinite(value)
+    quantized[finite] = np.round(np.clip((value[finite] - vmin) * scale, 0, VALUE_MAX))
+
+    return {
+        'vmin': vmin,
+        'vmax': vmax,
+        'max': VALUE_MAX,
+        'nan': VALUE_NAN,
+        'values': encode_array(quantized, 'uint16'),
+    }
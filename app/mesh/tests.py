@@ -1,3 +1,310 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import tempfile
+import zlib
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from .module.connectivity import CellConnectivity
+from .module.statistics import DatasetStatistics, QuantileSketch
+from .module.vtu_reader import VtkReader
+
+
+def make_mesh(nx=5, ny=4, nsys=3, seed=0):
+
+    # Grid of quads with the last row split into triangles (two cell types)
+    rng = np.random.default_rng(seed)
+    xs, ys = np.meshgrid(np.arange(nx + 1, dtype=float), np.arange(ny + 1, dtype=float))
+    points = np.c_[xs.ravel(), ys.ravel(), np.zeros(xs.size)] + rng.random((xs.size, 3)) * 0.1
+
+    cells = []
+    for j in range(ny):
+        for i in range(nx):
+            a = j * (nx + 1) + i
+            b, c, d = a + 1, a + nx + 2, a + nx + 1
+            if j < ny - 1:
+                cells.append([a, b, c, d])
+            else:
+                cells += [[a, b, c], [a, c, d]]
+    ncells = len(cells)
+
+    return {
+        'points': points,
+        'connectivity': np.concatenate(cells).astype('int32'),
+        'offsets': np.cumsum([len(c) for c in cells]).astype('int32'),
+        'types': np.array([9 if len(c) == 4 else 5 for c in cells], dtype='uint8'),
+        'Slip': rng.standard_normal((ncells, nsys)),
+        'Grain': rng.integers(0, 100, ncells).astype('int32'),
+    }
+
+
+def encode_block(data, *, header, compressor, block_size):
+
+    if compressor is None:
+        return np.array([len(data)], header).tobytes(), data
+
+    # [nblocks, block size, last block size, compressed sizes...]
+    blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+    compressed = [zlib.compress(b) for b in blocks]
+    last = len(blocks[-1]) if len(blocks[-1]) < block_size else 0
+    return np.array([len(blocks), block_size, last] + [len(c) for c in compressed], header).tobytes(), b''.join(compressed)
+
+
+def write_vtu(path, mesh, *, data_format='ascii', encoding='base64', compressor=None, header_type='UInt32',
+              byte_order='LittleEndian', split_header=False, block_size=256):
+
+    # Writes the mesh in one of the DataArray formats of the VTK XML file format
+    endian = '>' if byte_order == 'BigEndian' else '<'
+    header = np.dtype({'UInt32': 'u4', 'UInt64': 'u8'}[header_type]).newbyteorder(endian)
+    arrays = [
+        ('Points', None, 'Float64', mesh['points']),
+        ('Cells', 'connectivity', 'Int32', mesh['connectivity']),
+        ('Cells', 'offsets', 'Int32', mesh['offsets']),
+        ('Cells', 'types', 'UInt8', mesh['types']),
+        ('CellData', 'Slip', 'Float64', mesh['Slip']),
+        ('CellData', 'Grain', 'Int32', mesh['Grain']),
+    ]
+    vtk_types = VtkReader().vtk_types
+
+    attrib = 'byte_order="{}" header_type="{}"'.format(byte_order, header_type)
+    if compressor is not None:
+        attrib += ' compressor="{}"'.format(compressor)
+    lines = [
+        '<?xml version="1.0"?>',
+        '<VTKFile type="UnstructuredGrid" version="1.0" {}>'.format(attrib),
+        '<UnstructuredGrid>',
+        '<Piece NumberOfPoints="{}" NumberOfCells="{}">'.format(len(mesh['points']), len(mesh['types'])),
+    ]
+    appended = []
+    offset = 0
+    section = None
+    for name, tag, vtype, values in arrays:
+        if name != section:
+            if section is not None:
+                lines.append('</{}>'.format(section))
+            lines.append('<{}>'.format(name))
+            section = name
+        ncomp = values.shape[1] if values.ndim > 1 else 1
+        start = '<DataArray type="{}"{} NumberOfComponents="{}" format="{}"'.format(
+            vtype, '' if tag is None else ' Name="{}"'.format(tag), ncomp, data_format
+        )
+        if data_format == 'ascii':
+            lines.append(start + '>')
+            lines.append(' '.join(repr(v) for v in values.ravel().tolist()))
+            lines.append('</DataArray>')
+            continue
+
+        data = np.ascontiguousarray(values, dtype=np.dtype(vtk_types[vtype]).newbyteorder(endian)).tobytes()
+        head, data = encode_block(data, header=header, compressor=compressor, block_size=block_size)
+        if data_format == 'appended' and encoding == 'raw':
+            block = head + data
+        elif compressor is not None or split_header:
+            block = base64.b64encode(head) + base64.b64encode(data)
+        else:
+            block = base64.b64encode(head + data)
+        if data_format == 'binary':
+            lines.append(start + '>')
+            lines.append(block.decode('ascii'))
+            lines.append('</DataArray>')
+        else:
+            lines.append(start + ' offset="{}"/>'.format(offset))
+            appended.append(block)
+            offset += len(block)
+    lines += ['</{}>'.format(section), '</Piece>', '</UnstructuredGrid>']
+
+    contents = '\n'.join(lines).encode('ascii') + b'\n'
+    if data_format == 'appended':
+        contents += '<AppendedData encoding="{}">\n   _'.format(encoding).encode('ascii')
+        contents += b''.join(appended) + b'\n</AppendedData>\n'
+    contents += b'</VTKFile>\n'
+
+    with open(path, 'wb') as f:
+        f.write(contents)
+
+
+class VtkReaderTests(SimpleTestCase):
+
+    # Binary layouts: (format, appended encoding, compressor, separate header)
+    layouts = [
+        ('binary', None, None, False),
+        ('binary', None, None, True),
+        ('binary', None, 'vtkZLibDataCompressor', False),
+        ('appended', 'raw', None, False),
+        ('appended', 'raw', 'vtkZLibDataCompressor', False),
+        ('appended', 'base64', None, False),
+        ('appended', 'base64', None, True),
+        ('appended', 'base64', 'vtkZLibDataCompressor', False),
+    ]
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mesh = make_mesh()
+        self.ascii_path = os.path.join(self.tmp.name, 'ascii.vtu')
+        write_vtu(self.ascii_path, self.mesh)
+
+    def tearDown(self):
+
+        self.tmp.cleanup()
+
+    def read(self, path, **kwargs):
+
+        reader = VtkReader()
+        reader.read(path, **kwargs)
+        return reader
+
+    def assertSameFrame(self, reader, expected):
+
+        np.testing.assert_array_equal(reader.Coords, expected.Coords)
+        np.testing.assert_array_equal(reader.Lnodes.indices, expected.Lnodes.indices)
+        np.testing.assert_array_equal(reader.Lnodes.offsets, expected.Lnodes.offsets)
+        np.testing.assert_array_equal(reader.Lnodes.types, expected.Lnodes.types)
+        self.assertEqual(reader.get_data_dict(), expected.get_data_dict())
+        np.testing.assert_array_equal(reader.get_field('Slip'), expected.get_field('Slip'))
+        for system in (1, 3):
+            np.testing.assert_array_equal(reader.get_value('Slip', system=system), expected.get_value('Slip', system=system))
+        np.testing.assert_array_equal(reader.get_value('Grain', system=-1), expected.get_value('Grain', system=-1))
+        self.assertEqual(reader.get_IDs('Grain'), expected.get_IDs('Grain'))
+
+    def test_ascii(self):
+
+        reader = self.read(self.ascii_path)
+
+        np.testing.assert_array_equal(reader.Coords, self.mesh['points'].T)
+        np.testing.assert_array_equal(reader.Lnodes.indices, self.mesh['connectivity'])
+        np.testing.assert_array_equal(reader.Lnodes.offsets[1:], self.mesh['offsets'])
+        np.testing.assert_array_equal(reader.get_field('Slip'), self.mesh['Slip'])
+        self.assertEqual(reader.get_IDs('Grain'), [str(v) for v in self.mesh['Grain']])
+
+    def test_binary_formats(self):
+
+        expected = self.read(self.ascii_path)
+        for data_format, encoding, compressor, split_header in self.layouts:
+            for header_type in ('UInt32', 'UInt64'):
+                with self.subTest(data_format=data_format, encoding=encoding, compressor=compressor,
+                                  split_header=split_header, header_type=header_type):
+                    path = os.path.join(self.tmp.name, 'binary.vtu')
+                    write_vtu(path, self.mesh, data_format=data_format, encoding=encoding or 'base64',
+                              compressor=compressor, header_type=header_type, split_header=split_header)
+                    self.assertSameFrame(self.read(path), expected)
+
+    def test_big_endian(self):
+
+        expected = self.read(self.ascii_path)
+        for data_format, encoding in (('binary', 'base64'), ('appended', 'raw')):
+            with self.subTest(data_format=data_format, encoding=encoding):
+                path = os.path.join(self.tmp.name, 'big_endian.vtu')
+                write_vtu(path, self.mesh, data_format=data_format, encoding=encoding, byte_order='BigEndian',
+                          compressor='vtkZLibDataCompressor', header_type='UInt64')
+                self.assertSameFrame(self.read(path), expected)
+
+    def test_file_object(self):
+
+        path = os.path.join(self.tmp.name, 'raw.vtu')
+        write_vtu(path, self.mesh, data_format='appended', encoding='raw')
+        with open(path, 'rb') as f:
+            source = io.BytesIO(f.read())
+
+        self.assertSameFrame(self.read(source), self.read(self.ascii_path))
+
+    def test_cache(self):
+
+        path = os.path.join(self.tmp.name, 'compressed.vtu')
+        write_vtu(path, self.mesh, data_format='appended', encoding='raw', compressor='vtkZLibDataCompressor')
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        os.makedirs(cache_dir)
+
+        # First read fills the cache, the second one is served from it
+        self.read(path, cache_dir=cache_dir).read_all_fields()
+        self.assertSameFrame(self.read(path, cache_dir=cache_dir), self.read(self.ascii_path))
+
+
+class CellConnectivityTests(SimpleTestCase):
+
+    def test_groups(self):
+
+        mesh = make_mesh()
+        lnodes = CellConnectivity.from_vtk(mesh['connectivity'], mesh['offsets'], mesh['types'], ncells=mesh['types'].size)
+
+        ncells = 0
+        for cell_type, cells, nodes in lnodes.groups():
+            icells = np.arange(lnodes.ncells)[cells]
+            self.assertTrue(np.all(mesh['types'][icells] == cell_type))
+            for icell, cell_nodes in zip(icells, nodes):
+                np.testing.assert_array_equal(cell_nodes, lnodes.indices[lnodes.offsets[icell]:lnodes.offsets[icell + 1]])
+            ncells += icells.size
+        self.assertEqual(ncells, lnodes.ncells)
+
+    def test_single_group(self):
+
+        lnodes = CellConnectivity.from_vtk(np.arange(8), np.array([4, 8]), np.array([9, 9], dtype='uint8'), ncells=2)
+
+        groups = list(lnodes.groups())
+        self.assertEqual(len(groups), 1)
+        cell_type, cells, nodes = groups[0]
+        self.assertEqual(cell_type, 9)
+        np.testing.assert_array_equal(nodes, [[0, 1, 2, 3], [4, 5, 6, 7]])
+
+    def test_corner_groups(self):
+
+        # Quadratic triangle: mid-side nodes are dropped
+        lnodes = CellConnectivity.from_vtk(np.arange(6), np.array([6]), np.array([22], dtype='uint8'), ncells=1)
+
+        (cells, nodes), = lnodes.corner_groups()
+        np.testing.assert_array_equal(nodes, [[0, 1, 2]])
+
+
+class QuantileSketchTests(SimpleTestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        self.values = np.concatenate([rng.standard_normal(5000) * 10., np.zeros(100)])
+
+    def assertQuantiles(self, sketch, values):
+
+        for q in (0., 0.01, 0.25, 0.5, 0.75, 0.99, 1.):
+            # Value at the same rank as the sketch (lower interpolation)
+            expected = np.quantile(values, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), sketch.relative_accuracy * abs(expected) + 1.e-12)
+
+    def test_quantile(self):
+
+        sketch = QuantileSketch()
+        sketch.add(self.values)
+
+        self.assertEqual(sketch.count, self.values.size)
+        self.assertQuantiles(sketch, self.values)
+
+    def test_merge(self):
+
+        sketch = QuantileSketch()
+        for values in np.array_split(self.values, 7):
+            part = QuantileSketch()
+            part.add(values)
+            sketch.merge(QuantileSketch.from_dict(part.to_dict()))
+
+        self.assertEqual(sketch.count, self.values.size)
+        self.assertQuantiles(sketch, self.values)
+
+    def test_empty(self):
+
+        sketch = QuantileSketch()
+        sketch.add([np.nan, np.inf])
+
+        self.assertIsNone(sketch.quantile(0.5))
+        self.assertEqual(QuantileSketch.from_dict(sketch.to_dict()).count, 0)
+
+    def test_dataset_sketch(self):
+
+        # Sketches merged as frames arrive equal the sketch of all frames
+        statistics = DatasetStatistics()
+        expected = QuantileSketch()
+        for ifig, values in enumerate(np.array_split(self.values, 4)):
+            sketch = QuantileSketch()
+            sketch.add(values)
+            expected.merge(sketch)
+            statistics.add_frame(ifig, {'bounds': [0., 1., 0., 1.], 'fields': {'Slip': [sketch.to_dict()]}})
+            self.assertEqual(statistics.get_sketch('Slip', 1).to_dict(), expected.to_dict())
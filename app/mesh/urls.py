@@ -7,4 +7,8 @@ from . import mesh
 app_name = 'mesh'
 urlpatterns = [
     path('', views.mesh, name='mesh'),
+    path('image/<slug:key>.png', views.image, name='image'),
+    path('upload/', views.upload, name='upload'),
+    path('export/cell/', views.export_cell, name='export_cell'),
+    path('upload/<slug:dataset_id>/<str:name>', views.upload_file, name='upload_file'),
 ]
@@ -1,7 +1,122 @@
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import etag, require_http_methods, require_POST
+
+from .mesh import get_cell_history, get_image, get_session_key, get_upload_order, image_store, receive_chunk, registry, start_upload
+from .module.upload import get_offset
 
 
 @login_required
+@ensure_csrf_cookie
 def mesh(request):
     return render(request, 'mesh.html')
+
+
+# Key identifies the contents: the image never changes under the same URL
+@login_required
+@cache_control(private=True, max_age=365 * 24 * 3600, immutable=True)
+@etag(lambda request, key: key)
+def image(request, key):
+    if not image_store.exists(key):
+        out_img = get_image(key)
+        if out_img is None:
+            raise Http404('Image not found')
+        image_store.put(key, out_img)
+    image_store.touch(key)
+    # File is sent by nginx (internal location) after the login check
+    if settings.MESH_IMAGE_ACCEL_PREFIX:
+        response = HttpResponse(content_type='image/png')
+        response['X-Accel-Redirect'] = settings.MESH_IMAGE_ACCEL_PREFIX + image_store.get_name(key)
+        return response
+    return FileResponse(open(image_store.get_path(key), 'rb'), content_type='image/png')
+
+
+def get_upload_status(mdata, sources):
+    files = []
+    for name in get_upload_order(mdata):
+        files.append({
+            'name': name,
+            'source': sources.get(name),
+            'size': mdata.upload_files[name],
+            'url': reverse('mesh:upload_file', args=[mdata.dataset_id, name]),
+            'offset': get_offset(os.path.join(mdata.dataset_dir, name)),
+        })
+    return {'dataset': mdata.dataset_id, 'chunk_size': settings.MESH_UPLOAD_CHUNK_BYTES, 'files': files}
+
+
+# New dataset of the session: the files are sent afterwards in chunks
+@login_required
+@require_POST
+def upload(request):
+    try:
+        request_data = json.loads(request.body)
+        files = request_data['files']
+    except (ValueError, KeyError):
+        return HttpResponseBadRequest('Invalid upload request')
+    # Interrupted upload of the same dataset resumes from the received bytes
+    mdata = None
+    if request_data.get('dataset') is not None and request_data['dataset'] == registry.get_session_dataset(get_session_key(request)):
+        mdata = registry.get(request_data['dataset'])
+    if mdata is None:
+        pvd = request_data.get('pvd')
+        try:
+            mdata = start_upload(request, files, pvd.encode() if pvd is not None else None)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+    # Names of the client files (stored under valid file names)
+    sources = {get_valid_filename(os.path.basename(f['name'])): f['name'] for f in files}
+    return JsonResponse(get_upload_status(mdata, sources))
+
+
+# Chunk of a file (PUT with Content-Range) or the # of bytes received (GET)
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def upload_file(request, dataset_id, name):
+    if registry.get_session_dataset(request.session.session_key) != dataset_id:
+        raise Http404('Dataset not found')
+    mdata = registry.get(dataset_id)
+    if mdata is None or name not in mdata.upload_files:
+        raise Http404('File not found')
+    if request.method == 'GET':
+        return JsonResponse({'offset': get_offset(os.path.join(mdata.dataset_dir, name))})
+    try:
+        offset = receive_chunk(mdata, name, request, request.headers.get('Content-Range', ''))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    # View is opened once the first frame (with all its pieces) is being parsed
+    return JsonResponse({'offset': offset, 'ready': mdata.is_claimed(0, timeout=settings.MESH_INGEST_CLAIM_TIMEOUT)})
+
+
+# Values of one cell in all frames of the session dataset (CSV)
+@login_required
+def export_cell(request):
+    mdata = registry.get(registry.get_session_dataset(request.session.session_key))
+    if mdata is None:
+        raise Http404('Dataset not found')
+    try:
+        tag = request.GET['tag']
+        system = int(request.GET.get('system', 1))
+        icell = int(request.GET['cell'])
+        if system < 1 or icell < 0:
+            raise ValueError
+        history = get_cell_history(mdata, tag, system, icell)
+    except (KeyError, ValueError, IndexError):
+        return HttpResponseBadRequest('Invalid field, system or cell')
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="{}_{}_{}.csv"'.format(get_valid_filename(tag), system, icell)
+    writer = csv.writer(response)
+    writer.writerow(['frame', 'time', 'value'])
+    for ifig, value in enumerate(history):
+        time = mdata.time_list[ifig] if mdata.time_list is not None else ''
+        writer.writerow([ifig, time, value])
+    return response
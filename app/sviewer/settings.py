@@ -98,6 +98,24 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by all workers (errors of the cache server are ignored: the cache is skipped)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
+        "TIMEOUT": int(os.environ.get("CACHE_TIMEOUT", 3600)),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "IGNORE_EXCEPTIONS": True,
+            "SOCKET_CONNECT_TIMEOUT": 1,
+            "SOCKET_TIMEOUT": 1,
+        },
+    }
+}
+DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -146,6 +164,51 @@ if DEBUG:
 else:
     MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles/')
 
+# Mesh viewer
+MESH_FRAME_CACHE_BYTES = int(os.environ.get("MESH_FRAME_CACHE_BYTES", default=512 * 1024 ** 2))
+# Max # of open frames per worker (their memory-mapped arrays are not counted in MESH_FRAME_CACHE_BYTES)
+MESH_FRAME_CACHE_FRAMES = int(os.environ.get("MESH_FRAME_CACHE_FRAMES", default=256))
+MESH_NPY_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'mesh', 'npy')
+MESH_NPY_CACHE_BYTES = int(os.environ.get("MESH_NPY_CACHE_BYTES", default=10 * 1024 ** 3))
+MESH_DATASET_ROOT = os.path.join(MEDIA_ROOT, 'mesh', 'datasets')
+# Datasets of sessions not accessed for MESH_DATASET_TTL seconds are removed
+MESH_DATASET_TTL = int(os.environ.get("MESH_DATASET_TTL", default=24 * 3600))
+# Least recently used datasets are removed when all datasets (uploaded files and field columns) exceed MESH_DATASET_BYTES
+MESH_DATASET_BYTES = int(os.environ.get("MESH_DATASET_BYTES", default=20 * 1024 ** 3))
+# Max seconds a request waits for a frame being parsed (below the worker timeout of gunicorn: 30 s)
+MESH_FRAME_WAIT_TIMEOUT = float(os.environ.get("MESH_FRAME_WAIT_TIMEOUT", default=20))
+# Frames claimed by a worker which died or did not publish them within MESH_INGEST_CLAIM_TIMEOUT seconds are parsed again
+MESH_INGEST_CLAIM_TIMEOUT = float(os.environ.get("MESH_INGEST_CLAIM_TIMEOUT", default=600))
+# Uploaded files are sent in chunks of MESH_UPLOAD_CHUNK_BYTES (below client_max_body_size of nginx)
+MESH_UPLOAD_CHUNK_BYTES = int(os.environ.get("MESH_UPLOAD_CHUNK_BYTES", default=8 * 1024 ** 2))
+# Server directories which can be followed in tail mode (space-separated, none by default)
+MESH_WATCH_ROOTS = [p for p in os.environ.get("MESH_WATCH_ROOTS", default="").split(" ") if p]
+# Seconds between scans of a followed directory and since the last write of a new file
+MESH_WATCH_INTERVAL = float(os.environ.get("MESH_WATCH_INTERVAL", default=5))
+MESH_WATCH_SETTLE = float(os.environ.get("MESH_WATCH_SETTLE", default=2))
+# Fields of a dataset are stored in chunks of MESH_COLUMN_CHUNK_FRAMES frames (frames x cells x systems)
+MESH_COLUMN_CHUNK_FRAMES = int(os.environ.get("MESH_COLUMN_CHUNK_FRAMES", default=16))
+MESH_TOPOLOGY_ROOT = os.path.join(MEDIA_ROOT, 'mesh', 'topology')
+MESH_TOPOLOGY_CACHE_BYTES = int(os.environ.get("MESH_TOPOLOGY_CACHE_BYTES", default=2 * 1024 ** 3))
+MESH_INGEST_WORKERS = int(os.environ.get("MESH_INGEST_WORKERS", default=os.cpu_count()))
+# Percentiles of all frames used as the color range
+MESH_COLOR_PERCENTILES = [float(p) for p in os.environ.get("MESH_COLOR_PERCENTILES", default="0.5 99.5").split(" ")]
+# Render engine of cell values: 'matplotlib' (PolyCollection) or 'raster' (NumPy rasterizer)
+MESH_RENDER_ENGINE = os.environ.get("MESH_RENDER_ENGINE", default="matplotlib")
+# Max # of figures rendered at once
+MESH_RENDER_POOL_SIZE = int(os.environ.get("MESH_RENDER_POOL_SIZE", default=4))
+MESH_GEOMETRY_CACHE_BYTES = int(os.environ.get("MESH_GEOMETRY_CACHE_BYTES", default=256 * 1024 ** 2))
+MESH_IMAGE_CACHE_BYTES = int(os.environ.get("MESH_IMAGE_CACHE_BYTES", default=128 * 1024 ** 2))
+# Rendered images shared by all workers (Redis)
+MESH_IMAGE_CACHE_TTL = int(os.environ.get("MESH_IMAGE_CACHE_TTL", default=24 * 3600))
+# Rendered images as files (sent by nginx via X-Accel-Redirect when the internal location is set)
+MESH_IMAGE_ROOT = os.path.join(MEDIA_ROOT, 'mesh', 'images')
+MESH_IMAGE_STORE_BYTES = int(os.environ.get("MESH_IMAGE_STORE_BYTES", default=1024 ** 3))
+MESH_IMAGE_ACCEL_PREFIX = os.environ.get("MESH_IMAGE_ACCEL_PREFIX", default="")
+# Frames within +/- MESH_PREFETCH_WINDOW of the displayed one are rendered in the background
+MESH_PREFETCH_WINDOW = int(os.environ.get("MESH_PREFETCH_WINDOW", default=2))
+MESH_PREFETCH_WORKERS = int(os.environ.get("MESH_PREFETCH_WORKERS", default=2))
+
 ASGI_APPLICATION = 'sviewer.routing.application'
 
 CHANNEL_LAYERS = {